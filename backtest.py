@@ -1,166 +1,423 @@
 import logging
+import argparse
+import itertools
+import time
+import multiprocessing
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
 import json
 import numpy as np
-from data_processor import DataProcessor
+import pyarrow as pa
+import pyarrow.parquet as pq
+from numpy.lib.stride_tricks import sliding_window_view
+from panel import FIELDS, PANEL_DIR, open_panel
+from scoring import INT_COLUMNS, SCORE_COLUMNS, score_arrays
+import metrics
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 import csv
 
 class DataLoader:
-    def __init__(self):
-        self.data_file = "data.csv"
+    def __init__(self, panel_dir=PANEL_DIR):
+        self.panel_dir = panel_dir
         
     def load_data(self):
-        """从data.csv加载数据"""
+        """从内存映射的数据面板加载数据"""
         try:
-            # 读取data.csv
-            df = pd.read_csv(self.data_file)
-            logging.info(f"Loaded {len(df)} coins from data.csv")
+            panel = open_panel(self.panel_dir)
+            logging.info(f"Loaded {len(panel.coin_ids)} coins from panel generation {panel.generation}")
             
             coin_data = {}
-            for _, row in df.iterrows():
-                try:
-                    # 解析历史数据
-                    historical_data = json.loads(row['historical_data'])
-                    
-                    # 处理价格、交易量和市值数据
-                    prices_df = DataProcessor.process_data({"prices": historical_data['prices']})
-                    volumes_df = DataProcessor.process_data({"prices": historical_data['total_volumes']}).rename(columns={'price': 'volume'})
-                    market_caps_df = DataProcessor.process_data({"prices": historical_data['market_caps']}).rename(columns={'price': 'market_cap'})
-                    
-                    # 合并所有数据
-                    combined_df = prices_df.join(volumes_df['volume']).join(market_caps_df['market_cap'])
-                    
-                    symbol = row['symbol'].upper()
-                    coin_data[symbol] = {
-                        'data': combined_df,
-                        'info': {
-                            'id': row['id'],
-                            'symbol': symbol,
-                            'name': row['name']
-                        }
-                    }
-                    
-                    logging.info(f"Processed {symbol}")
-                    
-                except Exception as e:
-                    logging.warning(f"Error processing {row['symbol']}: {e}")
+            for coin_id, symbol, name in zip(panel.coin_ids, panel.symbols, panel.names):
+                combined_df = panel.frame(coin_id)
+                if combined_df is None:
+                    logging.warning(f"Error processing {symbol}: no history")
                     continue
                     
+                symbol = symbol.upper()
+                coin_data[symbol] = {
+                    'data': combined_df,
+                    'info': {
+                        'id': coin_id,
+                        'symbol': symbol,
+                        'name': name
+                    }
+                }
+                
             return coin_data
             
         except Exception as e:
             logging.error(f"Error loading data: {e}")
             raise
 
+class SignalMatrix:
+    """
+    预先计算的 日期 × 币种 评分矩阵
+
+    对每个币种在每个日期之前的最近 lookback_days 行数据（与 generate_signals 的窗口相同）
+    用批量评分引擎一次算完，回测循环只需要按日期取一行。
+    """
+
+    def __init__(self, dates, symbols, scores, valid, lookback_days):
+        self.dates = dates
+        self.symbols = symbols
+        self.scores = scores
+        self.valid = valid
+        self.lookback_days = lookback_days
+        self._positions = {date: i for i, date in enumerate(dates)}
+
+    @classmethod
+    def build(cls, coin_data, dates, lookback_days=30):
+        """
+        参数:
+            coin_data (dict): DataLoader.load_data() 的结果
+            dates (list): 需要评分的日期
+        """
+        dates = pd.DatetimeIndex(dates)
+        targets = dates.as_unit('ns').asi8
+        symbols = list(coin_data)
+        windows, cells = [], []
+
+        for j, symbol in enumerate(symbols):
+            df = coin_data[symbol]['data']
+            if len(df) < lookback_days:
+                continue
+            if not df.index.is_monotonic_increasing:
+                df = df.sort_index(kind='stable')
+            # 每个日期之前（含当天）的行数，窗口为 [ends - lookback_days, ends)
+            # 统一换算成纳秒时间戳比较，避免时区和时间精度不同
+            ends = np.searchsorted(df.index.as_unit('ns').asi8, targets, side='right')
+            rows = np.flatnonzero(ends >= lookback_days)
+            if len(rows) == 0:
+                continue
+            values = df[list(FIELDS)].to_numpy(dtype=np.float64)
+            view = sliding_window_view(values, lookback_days, axis=0)
+            windows.append(view[ends[rows] - lookback_days])
+            cells.append(np.column_stack([rows, np.full(len(rows), j)]))
+
+        scores = {column: np.full((len(dates), len(symbols)), np.nan) for column in SCORE_COLUMNS}
+        valid = np.zeros((len(dates), len(symbols)), dtype=bool)
+        if windows:
+            windows = np.concatenate(windows)
+            cells = np.concatenate(cells)
+            window_scores, window_valid = score_arrays(windows[:, 0], windows[:, 1], windows[:, 2])
+            for column in SCORE_COLUMNS:
+                scores[column][cells[:, 0], cells[:, 1]] = window_scores[column]
+            valid[cells[:, 0], cells[:, 1]] = window_valid
+
+        logging.info(f"Precomputed scores for {len(symbols)} coins over {len(dates)} dates")
+        return cls(list(dates), symbols, scores, valid, lookback_days)
+
+    def covers(self, date, lookback_days):
+        return lookback_days == self.lookback_days and date in self._positions
+
+    def signals(self, date):
+        """某个日期的信号，格式与 calculate_indicators 的结果一致"""
+        i = self._positions[date]
+        signals = {}
+        for j in np.flatnonzero(self.valid[i]):
+            signals[self.symbols[j]] = {
+                column: int(self.scores[column][i, j]) if column in INT_COLUMNS else self.scores[column][i, j].item()
+                for column in SCORE_COLUMNS
+            }
+        return signals
+
+class PriceMatrix:
+    """
+    对齐的 日期 × 币种 价格矩阵
+
+    present 标记币种在该日期是否有数据；没有数据的 (日期, 币种) 不参与交易，
+    与原来按日期标签查找失败时跳过的行为一致。
+    """
+
+    def __init__(self, dates, symbols, prices, present):
+        self.dates = dates
+        self.symbols = symbols
+        self.prices = prices
+        self.present = present
+        self.rows = {date: i for i, date in enumerate(dates)}
+        self.columns = {symbol: j for j, symbol in enumerate(symbols)}
+
+    @classmethod
+    def build(cls, coin_data, dates):
+        """
+        参数:
+            coin_data (dict): DataLoader.load_data() 的结果
+            dates (list): 矩阵的行（日期）
+        """
+        index = pd.DatetimeIndex(dates)
+        symbols = list(coin_data)
+        prices = np.full((len(index), len(symbols)), np.nan)
+        present = np.zeros(prices.shape, dtype=bool)
+
+        for j, symbol in enumerate(symbols):
+            df = coin_data[symbol]['data']
+            positions = index.get_indexer(df.index)
+            found = positions >= 0
+            prices[positions[found], j] = df['price'].to_numpy(dtype=np.float64)[found]
+            present[positions[found], j] = True
+
+        return cls(list(dates), symbols, prices, present)
+
+    def covers(self, dates):
+        return all(date in self.rows for date in dates)
+
+class Position:
+    """单个币种的持仓"""
+
+    __slots__ = ('quantity', 'entry_price', 'entry_date', 'current_price')
+
+    def __init__(self, quantity, entry_price, entry_date, current_price):
+        self.quantity = quantity
+        self.entry_price = entry_price
+        self.entry_date = entry_date
+        self.current_price = current_price
+
+class TradeLedger:
+    """
+    回测日志的内存缓冲
+
+    每日组合记录和交易记录先追加到内存中，回测结束时（或缓冲达到 flush_every 行时）批量写出：
+        'csv'     追加到按日期命名的 backtest_log_*.csv / trade_log_*.csv，格式与逐行写入时相同
+        'parquet' 写入 backtest_log_*.parquet / trade_log_*.parquet（每次回测覆盖）
+        None      不写文件，用于参数扫描
+    """
+
+    OUTPUTS = ('csv', 'parquet', None)
+    PORTFOLIO_COLUMNS = ['date', 'total_value', 'cash', 'positions', 'daily_return']
+    TRADE_COLUMNS = ['date', 'symbol', 'action', 'price', 'quantity', 'value',
+                     'stop_loss', 'take_profit', 'signal_score']
+    PORTFOLIO_HEADER = ['Date', 'Total Value', 'Cash', 'Positions', 'Daily Return']
+    TRADE_HEADER = ['Date', 'Symbol', 'Action', 'Price', 'Quantity',
+                    'Value', 'Stop Loss', 'Take Profit', 'Signal Score']
+
+    def __init__(self, output='csv', flush_every=None):
+        if output not in self.OUTPUTS:
+            raise ValueError(f"Unknown ledger output: {output}")
+        self.output = output
+        self.flush_every = flush_every
+        self.portfolio_rows = []
+        self.trade_rows = []
+        self._writers = {}
+
+        # 使用当前日期生成日志文件名
+        current_date = datetime.now().strftime('%Y%m%d')
+        extension = 'parquet' if output == 'parquet' else 'csv'
+        self.portfolio_file = f"backtest_log_{current_date}.{extension}"
+        self.trade_file = f"trade_log_{current_date}.{extension}"
+
+        # CSV 只在文件不存在时写表头
+        if output == 'csv':
+            self._init_csv(self.portfolio_file, self.PORTFOLIO_HEADER)
+            self._init_csv(self.trade_file, self.TRADE_HEADER)
+
+    @property
+    def enabled(self):
+        return self.output is not None
+
+    def add_portfolio(self, row):
+        """row: (date, total_value, cash, positions, daily_return)"""
+        self.portfolio_rows.append(row)
+        self._maybe_flush()
+
+    def add_trade(self, row):
+        """row: (date, symbol, action, price, quantity, value, stop_loss, take_profit, signal_score)"""
+        self.trade_rows.append(row)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if self.flush_every and len(self.portfolio_rows) + len(self.trade_rows) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """把缓冲的记录写出并清空缓冲"""
+        if self.output == 'csv':
+            self._append_csv(self.portfolio_file, [self._format_portfolio(row) for row in self.portfolio_rows])
+            self._append_csv(self.trade_file, [self._format_trade(row) for row in self.trade_rows])
+        elif self.output == 'parquet':
+            self._append_parquet(self.portfolio_file, self.PORTFOLIO_COLUMNS, self.portfolio_rows)
+            self._append_parquet(self.trade_file, self.TRADE_COLUMNS, self.trade_rows)
+        self.portfolio_rows = []
+        self.trade_rows = []
+
+    def close(self):
+        """写出剩余记录；Parquet 文件写完后原子替换到目标路径"""
+        self.flush()
+        for path, writer in self._writers.items():
+            writer.close()
+            os.replace(f"{path}.tmp", path)
+        self._writers = {}
+
+    @staticmethod
+    def _init_csv(path, header):
+        if not os.path.exists(path):
+            with open(path, 'w', newline='') as f:
+                csv.writer(f).writerow(header)
+
+    @staticmethod
+    def _append_csv(path, rows):
+        if rows:
+            with open(path, 'a', newline='') as f:
+                csv.writer(f).writerows(rows)
+
+    @staticmethod
+    def _format_portfolio(row):
+        date, total_value, cash, positions, daily_return = row
+        return [date, f"{total_value:.2f}", f"{cash:.2f}", positions, f"{daily_return:.2f}%"]
+
+    @staticmethod
+    def _format_trade(row):
+        date, symbol, action, price, quantity, value, stop_loss, take_profit, signal_score = row
+        return [
+            date,
+            symbol,
+            action,
+            f"{price:.4f}",
+            f"{quantity:.4f}",
+            f"{value:.2f}",
+            f"{stop_loss:.4f}",
+            f"{take_profit:.4f}",
+            signal_score if signal_score else "N/A"
+        ]
+
+    def _append_parquet(self, path, columns, rows):
+        if not rows:
+            return
+        df = pd.DataFrame(rows, columns=columns)
+        if 'signal_score' in df:
+            df['signal_score'] = df['signal_score'].astype('float64')
+        writer = self._writers.get(path)
+        if writer is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            writer = self._writers[path] = pq.ParquetWriter(f"{path}.tmp", table.schema)
+        else:
+            table = pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False)
+        writer.write_table(table)
+
 class Backtester:
-    def __init__(self, coin_data, initial_capital=10000, stop_loss=0.1, take_profit=0.2):
+    def __init__(self, coin_data, initial_capital=10000, stop_loss=0.1, take_profit=0.2,
+                 max_positions=5, max_position_size=0.1, buy_threshold=7,
+                 log_output='csv', flush_every=None):
         self.coin_data = coin_data
         self.initial_capital = initial_capital
         self.current_capital = initial_capital
         self.positions = {}
-        self.portfolio_history = []
         self.trades_history = []
         
         # 风险管理参数
         self.stop_loss = stop_loss
         self.take_profit = take_profit
-        self.max_position_size = 0.1  # 单个仓位最大占比
+        self.max_position_size = max_position_size  # 单个仓位最大占比
         self.min_trade_amount = 100   # 最小交易金额
-        self.max_positions = 5        # 最大持仓数量
+        self.max_positions = max_positions          # 最大持仓数量
+        self.buy_threshold = buy_threshold          # 买入信号的最低总分（不含）
+        
+        # 组合历史：每个日期一行，总价值、现金和各币种持仓数量（日期 × 币种）保存在预分配的数组中
+        self.symbol_columns = {symbol: j for j, symbol in enumerate(coin_data)}
+        self.history_dates = []
+        self.history_length = 0
+        self._allocate_history(1)
         
         # 记录初始状态
-        self.portfolio_history.append({
-            'date': pd.Timestamp.now(tz='UTC'),
-            'value': initial_capital,
-            'cash': initial_capital,
-            'positions': {}
-        })
+        self._record_history(pd.Timestamp.now(tz='UTC'), initial_capital)
         
         logging.info(f"Backtester initialized with {initial_capital:.2f} capital")
         
-        # 使用当前日期生成日志文件名
-        current_date = datetime.now().strftime('%Y%m%d')
-        self.log_file = f"backtest_log_{current_date}.csv"
-        self.trade_log_file = f"trade_log_{current_date}.csv"
-        
-        # 只在文件不存在时初始化日志文件
-        self.initialize_log_files()
+        # 交易和组合日志先缓存在内存中，回测结束时批量写出（log_output=None 时不写文件）
+        self.ledger = TradeLedger(log_output, flush_every)
         
         self.performance_metrics = {}
+        self.signal_matrix = None
+        self.price_matrix = None
+        self.missing_prices = 0                     # 因币种在该日期没有数据而跳过的价格查找次数
 
-    def initialize_log_files(self):
-        """初始化日志文件，只在文件不存在时创建"""
-        # 初始化回测日志
-        if not os.path.exists(self.log_file):
-            with open(self.log_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Date', 'Total Value', 'Cash', 'Positions', 'Daily Return'])
-            
-        # 初始化交易日志
-        if not os.path.exists(self.trade_log_file):
-            with open(self.trade_log_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Date', 'Symbol', 'Action', 'Price', 'Quantity', 
-                               'Value', 'Stop Loss', 'Take Profit', 'Signal Score'])
+    def _allocate_history(self, capacity):
+        """把组合历史数组扩展到至少 capacity 行"""
+        capacity = max(capacity, 1)
+        values = np.empty(capacity)
+        cash = np.empty(capacity)
+        holdings = np.zeros((capacity, len(self.symbol_columns)))
+        if self.history_length:
+            n = self.history_length
+            values[:n] = self.values[:n]
+            cash[:n] = self.cash[:n]
+            holdings[:n] = self.holdings[:n]
+        self.values, self.cash, self.holdings = values, cash, holdings
+
+    def _record_history(self, date, total_value):
+        """记录一个日期的总价值、现金和持仓数量"""
+        row = self.history_length
+        if row == len(self.values):
+            self._allocate_history(2 * row)
+        self.values[row] = total_value
+        self.cash[row] = self.current_capital
+        for symbol, position in self.positions.items():
+            self.holdings[row, self.symbol_columns[symbol]] = position.quantity
+        self.history_dates.append(date)
+        self.history_length = row + 1
+
+    @property
+    def portfolio_values(self):
+        """每个日期的组合总价值（第一行为初始资金）"""
+        return self.values[:self.history_length]
+
+    @property
+    def final_value(self):
+        return self.values[self.history_length - 1]
+
+    def portfolio_frame(self):
+        """组合历史的 DataFrame：date, value, cash 和每个币种的持仓数量"""
+        n = self.history_length
+        frame = pd.DataFrame(self.holdings[:n], columns=list(self.symbol_columns))
+        frame.insert(0, 'date', self.history_dates)
+        frame.insert(1, 'value', self.values[:n])
+        frame.insert(2, 'cash', self.cash[:n])
+        return frame
 
     def log_portfolio(self, date, total_value):
         """记录每日投资组合状态"""
+        if not self.ledger.enabled:
+            return
         positions_str = '; '.join([
-            f"{symbol}: {pos['quantity']:.2f}@{pos['current_price']:.2f}" 
+            f"{symbol}: {pos.quantity:.2f}@{pos.current_price:.2f}" 
             for symbol, pos in self.positions.items()
         ])
         
         # 计算日收益率
-        if len(self.portfolio_history) > 1:
-            prev_value = self.portfolio_history[-2]['value']
+        if self.history_length > 1:
+            prev_value = self.values[self.history_length - 2]
             daily_return = (total_value - prev_value) / prev_value * 100
         else:
             daily_return = 0
             
-        with open(self.log_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                date,
-                f"{total_value:.2f}",
-                f"{self.current_capital:.2f}",
-                positions_str,
-                f"{daily_return:.2f}%"
-            ])
+        self.ledger.add_portfolio((date, total_value, self.current_capital, positions_str, daily_return))
 
     def log_trade(self, date, symbol, action, price, quantity, value, signal_score=None):
         """记录交易详情"""
-        with open(self.trade_log_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                date,
-                symbol,
-                action,
-                f"{price:.4f}",
-                f"{quantity:.4f}",
-                f"{value:.2f}",
-                f"{price * (1 - self.stop_loss):.4f}",
-                f"{price * (1 + self.take_profit):.4f}",
-                signal_score if signal_score else "N/A"
-            ])
-
-    def run_backtest(self):
-        """运行回测"""
-        # 获取所有日期
-        dates = []
-        for symbol in self.coin_data:
-            df = self.coin_data[symbol]['data']
-            dates.extend(df.index.tolist())
-        
-        # 去重并排序
-        dates = sorted(list(set(dates)))
-        
-        # 回测每一天
+        if not self.ledger.enabled:
+            return
+        self.ledger.add_trade((
+            date, symbol, action, price, quantity, value,
+            price * (1 - self.stop_loss), price * (1 + self.take_profit), signal_score
+        ))
+
+    def run_backtest(self, dates=None):
+        """
+        运行回测
+
+        参数:
+            dates (list): 回测的日期，默认为所有币种数据日期的并集
+        """
+        if dates is None:
+            dates = backtest_dates(self.coin_data)
+        self._allocate_history(self.history_length + len(dates))
+        if self.price_matrix is None or not self.price_matrix.covers(dates):
+            self.price_matrix = PriceMatrix.build(self.coin_data, dates)
+        started = time.perf_counter()
+        
+        # 回测每一天（循环内不输出日志，只在出错时记录）
         for current_date in dates:
-            logging.info(f"Processing date: {current_date}")
-            
             try:
                 # 生成交易信号
                 signals = self.generate_signals(self.coin_data, dates, current_date)
@@ -178,8 +435,16 @@ class Backtester:
                 logging.error(f"Error processing date {current_date}: {e}")
                 continue
 
+        self.ledger.close()
+        logging.info(f"Backtested {len(dates)} dates with {len(self.trades_history)} trades "
+                     f"in {time.perf_counter() - started:.1f}s")
+        if self.missing_prices:
+            logging.info(f"Skipped {self.missing_prices} price lookups for coins without data on that date")
+
         # 在回测结束后计算性能指标
         self.calculate_performance_metrics()
+        if not self.performance_metrics:
+            return
         
         # 输出关键指标
         logging.info(f"""
@@ -192,44 +457,55 @@ class Backtester:
         平均持仓天数: {self.performance_metrics['average_holding_days']:.1f}
         最大回撤: {self.performance_metrics['max_drawdown']:.2%}
         夏普比率: {self.performance_metrics['sharpe_ratio']:.2f}
+        索提诺比率: {self.performance_metrics['sortino_ratio']:.2f}
+        卡玛比率: {self.performance_metrics['calmar_ratio']:.2f}
         总收益率: {self.performance_metrics['total_return']:.2%}
         """)
 
     def generate_signals(self, coin_data, dates, current_date, lookback_days=30):
-        """生成交易信号"""
-        signals = {}
-        
-        for symbol, data in coin_data.items():
-            try:
-                df = data['data']
-                historical_data = df[df.index <= current_date].tail(lookback_days)
-                
-                if len(historical_data) < lookback_days:
-                    continue
-                    
-                indicators = DataProcessor.calculate_indicators(historical_data)
-                if indicators is not None:
-                    signals[symbol] = indicators
-                    
-            except Exception as e:
-                logging.warning(f"Error generating signal for {symbol}: {e}")
-                continue
-                
-        return signals
+        """
+        生成交易信号
+
+        第一次调用时为 dates 中的所有日期预先计算评分矩阵，之后每个日期只需要查表。
+        """
+        if (self.signal_matrix is None or self.signal_matrix.symbols != list(coin_data)
+                or not self.signal_matrix.covers(current_date, lookback_days)):
+            self.signal_matrix = SignalMatrix.build(coin_data, dates, lookback_days)
+        return self.signal_matrix.signals(current_date)
+
+    def prices_at(self, date):
+        """
+        某个日期所有币种的价格和是否有数据（按 price_matrix.columns 的列顺序）
+
+        价格矩阵不包含该日期时先为所有数据日期重新构建。
+        """
+        if self.price_matrix is None or date not in self.price_matrix.rows:
+            dates = backtest_dates(self.coin_data)
+            if date not in set(dates):
+                dates = sorted(dates + [date])
+            self.price_matrix = PriceMatrix.build(self.coin_data, dates)
+        row = self.price_matrix.rows[date]
+        return self.price_matrix.prices[row], self.price_matrix.present[row]
 
     def update_positions(self, current_date):
         """更新持仓状态"""
+        prices, present = self.prices_at(current_date)
+        columns = self.price_matrix.columns
         for symbol in list(self.positions.keys()):
+            j = columns[symbol]
+            if not present[j]:
+                self.missing_prices += 1
+                continue
             try:
                 position = self.positions[symbol]
-                current_price = self.coin_data[symbol]['data'].loc[current_date, 'price']
+                current_price = prices[j]
                 
                 # 更新持仓价值
-                position['current_price'] = current_price
-                position_value = position['quantity'] * current_price
+                position.current_price = current_price
+                position_value = position.quantity * current_price
                 
                 # 检查止损和止盈
-                entry_price = position['entry_price']
+                entry_price = position.entry_price
                 price_change = (current_price - entry_price) / entry_price
                 
                 if price_change <= -self.stop_loss or price_change >= self.take_profit:
@@ -251,11 +527,18 @@ class Backtester:
             reverse=True
         )
         
+        prices, present = self.prices_at(current_date)
+        columns = self.price_matrix.columns
+        
         # 执行交易
         for symbol, signal in sorted_signals[:self.max_positions]:
             try:
-                if symbol not in self.positions and signal['total_score'] > 7:
-                    current_price = self.coin_data[symbol]['data'].loc[current_date, 'price']
+                if symbol not in self.positions and signal['total_score'] > self.buy_threshold:
+                    j = columns[symbol]
+                    if not present[j]:
+                        self.missing_prices += 1
+                        continue
+                    current_price = prices[j]
                     available_capital = self.current_capital * self.max_position_size
                     quantity = available_capital / current_price
                     
@@ -272,12 +555,7 @@ class Backtester:
         if position_value > self.current_capital:
             return
             
-        self.positions[symbol] = {
-            'quantity': quantity,
-            'entry_price': price,
-            'entry_date': date,
-            'current_price': price
-        }
+        self.positions[symbol] = Position(quantity, price, date, price)
         
         self.current_capital -= position_value
         
@@ -293,13 +571,11 @@ class Backtester:
         
         # 记录到日志
         self.log_trade(date, symbol, 'BUY', price, quantity, position_value, signal_score)
-        
-        logging.info(f"Opened position: {symbol} at {price:.2f}")
 
     def close_position(self, symbol, price, date):
         """平仓"""
         position = self.positions[symbol]
-        position_value = position['quantity'] * price
+        position_value = position.quantity * price
         self.current_capital += position_value
         
         # 记录交易
@@ -308,45 +584,37 @@ class Backtester:
             'symbol': symbol,
             'action': 'sell',
             'price': price,
-            'quantity': position['quantity'],
+            'quantity': position.quantity,
             'value': position_value
         })
         
         # 记录到日志
-        self.log_trade(date, symbol, 'SELL', price, position['quantity'], position_value)
+        self.log_trade(date, symbol, 'SELL', price, position.quantity, position_value)
         
         del self.positions[symbol]
-        logging.info(f"Closed position: {symbol} at {price:.2f}")
 
     def update_portfolio_value(self, date):
         """更新投资组合价值"""
         total_value = self.current_capital
+        prices, present = self.prices_at(date)
+        columns = self.price_matrix.columns
         
         for symbol, position in self.positions.items():
-            try:
-                current_price = self.coin_data[symbol]['data'].loc[date, 'price']
-                position_value = position['quantity'] * current_price
-                total_value += position_value
-            except Exception as e:
-                logging.warning(f"Error calculating position value for {symbol}: {e}")
-                continue
+            j = columns[symbol]
+            # 该日期没有数据时按最近一次的价格估值
+            current_price = prices[j] if present[j] else position.current_price
+            position_value = position.quantity * current_price
+            total_value += position_value
                 
-        self.portfolio_history.append({
-            'date': date,
-            'value': total_value,
-            'cash': self.current_capital,
-            'positions': {s: p.copy() for s, p in self.positions.items()}
-        })
+        self._record_history(date, total_value)
         
         # 记录到日志
         self.log_portfolio(date, total_value)
-        
-        logging.info(f"Portfolio value at {date}: {total_value:.2f}")
 
     def plot_portfolio_performance(self):
         """绘制投资组合表现"""
-        dates = [ph['date'] for ph in self.portfolio_history]
-        values = [ph['value'] for ph in self.portfolio_history]
+        dates = self.history_dates
+        values = self.portfolio_values
         
         plt.figure(figsize=(12, 6))
         plt.plot(dates, values, label='Portfolio Value')
@@ -364,102 +632,28 @@ class Backtester:
         plt.close()
 
     def calculate_performance_metrics(self):
-        """计算回测性能指标"""
-        # 准备数据
+        """计算回测性能指标（向量化的先进先出配对和组合指标，见 metrics.py）"""
         trades = pd.DataFrame(self.trades_history)
         if len(trades) == 0:
             logging.warning("No trades to analyze")
             return
             
-        # 计算每笔交易的收益
-        trades_grouped = trades.groupby(['symbol']).agg({
-            'date': list,
-            'price': list,
-            'value': list,
-            'action': list
-        })
-        
-        trade_results = []
-        for _, group in trades_grouped.iterrows():
-            buys = [(d, p, v) for d, p, v, a in zip(group['date'], group['price'], 
-                    group['value'], group['action']) if a == 'buy']
-            sells = [(d, p, v) for d, p, v, a in zip(group['date'], group['price'], 
-                    group['value'], group['action']) if a == 'sell']
-            
-            for buy, sell in zip(buys, sells):
-                if sell[1] > buy[1]:  # 盈利
-                    profit = (sell[1] - buy[1]) / buy[1]
-                    trade_results.append({
-                        'result': 'win',
-                        'profit': profit,
-                        'buy_date': buy[0],
-                        'sell_date': sell[0],
-                        'holding_days': (pd.to_datetime(sell[0]) - pd.to_datetime(buy[0])).days
-                    })
-                else:  # 亏损
-                    loss = (sell[1] - buy[1]) / buy[1]
-                    trade_results.append({
-                        'result': 'loss',
-                        'profit': loss,
-                        'buy_date': buy[0],
-                        'sell_date': sell[0],
-                        'holding_days': (pd.to_datetime(sell[0]) - pd.to_datetime(buy[0])).days
-                    })
-        
-        # 转换为DataFrame
-        results_df = pd.DataFrame(trade_results)
-        
-        # 计算关键指标
-        total_trades = len(results_df)
-        winning_trades = len(results_df[results_df['result'] == 'win'])
-        losing_trades = len(results_df[results_df['result'] == 'loss'])
-        
-        # 计算收益指标
-        portfolio_values = pd.DataFrame([{
-            'date': ph['date'],
-            'value': ph['value']
-        } for ph in self.portfolio_history])
-        portfolio_values['daily_return'] = portfolio_values['value'].pct_change()
-        
-        self.performance_metrics = {
-            'total_trades': total_trades,
-            'winning_trades': winning_trades,
-            'losing_trades': losing_trades,
-            'win_rate': winning_trades / total_trades if total_trades > 0 else 0,
-            'average_win': results_df[results_df['profit'] > 0]['profit'].mean() if winning_trades > 0 else 0,
-            'average_loss': results_df[results_df['profit'] < 0]['profit'].mean() if losing_trades > 0 else 0,
-            'profit_factor': abs(results_df[results_df['profit'] > 0]['profit'].sum() / 
-                               results_df[results_df['profit'] < 0]['profit'].sum()) if losing_trades > 0 else float('inf'),
-            'average_holding_days': results_df['holding_days'].mean(),
-            'max_drawdown': self.calculate_max_drawdown(),
-            'sharpe_ratio': self.calculate_sharpe_ratio(portfolio_values['daily_return']),
-            'total_return': (self.portfolio_history[-1]['value'] - self.initial_capital) / self.initial_capital
-        }
+        self.performance_metrics = metrics.performance_metrics(trades, self.portfolio_values, self.initial_capital)
+        if not self.performance_metrics:
+            logging.warning("No completed trades to analyze")
+            return
         
         # 保存性能指标到CSV
-        self.save_performance_metrics()
+        if self.ledger.enabled:
+            self.save_performance_metrics()
         
     def calculate_max_drawdown(self):
         """计算最大回撤"""
-        values = [ph['value'] for ph in self.portfolio_history]
-        peak = values[0]
-        max_dd = 0
-        
-        for value in values:
-            if value > peak:
-                peak = value
-            dd = (peak - value) / peak
-            if dd > max_dd:
-                max_dd = dd
-                
-        return max_dd
+        return metrics.max_drawdown(self.portfolio_values)
         
     def calculate_sharpe_ratio(self, returns, risk_free_rate=0.02):
         """计算夏普比率"""
-        if len(returns) < 2:
-            return 0
-        excess_returns = returns - risk_free_rate/252  # 转换为日化无风险收益率
-        return np.sqrt(252) * excess_returns.mean() / returns.std() if returns.std() != 0 else 0
+        return metrics.sharpe_ratio(returns, risk_free_rate)
         
     def save_performance_metrics(self):
         """保存性能指标到CSV"""
@@ -473,7 +667,234 @@ class Backtester:
                 
         logging.info(f"Performance metrics saved to {metrics_file}")
         
+def backtest_dates(coin_data):
+    """所有币种数据日期的并集，去重并排序"""
+    indexes = [coin_data[symbol]['data'].index for symbol in coin_data]
+    if not indexes:
+        return []
+    first = indexes[0]
+    values = np.unique(np.concatenate([index.as_unit('ns').asi8 for index in indexes]))
+    dates = pd.DatetimeIndex(values, tz='UTC').tz_convert(first.tz).as_unit(first.unit)
+    return dates.tolist()
+
+# 参数扫描支持的 Backtester 参数
+SWEEP_PARAMS = ('stop_loss', 'take_profit', 'max_positions', 'max_position_size', 'buy_threshold')
+
+# 参数扫描和滚动前推的共享数据 (coin_data, dates, signal_matrix, price_matrix, initial_capital)，
+# 由父进程在创建进程池之前设置，fork 出的子进程直接以写时复制的方式共享，不需要为每个任务序列化
+_sweep_data = None
+
+def _init_sweep(data):
+    """进程池初始化：不支持 fork 的平台上每个子进程只接收一次共享数据，并关闭每次回测的 INFO 日志"""
+    global _sweep_data
+    if data is not None:
+        _sweep_data = data
+    logging.getLogger().setLevel(logging.WARNING)
+
+def _prepare_shared(coin_data, initial_capital):
+    """加载一次所有日期的信号矩阵和价格矩阵，作为进程池任务的共享数据"""
+    global _sweep_data
+    dates = backtest_dates(coin_data)
+    _sweep_data = (coin_data, dates, SignalMatrix.build(coin_data, dates),
+                   PriceMatrix.build(coin_data, dates), initial_capital)
+    return dates
+
+def _map_shared(func, tasks, workers):
+    """在共享 _sweep_data 的进程池中执行任务（workers 为 1 时在当前进程中执行）"""
+    if workers > 1 and len(tasks) > 1:
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context, initargs = multiprocessing.get_context('fork'), (None,)
+        else:
+            context, initargs = None, (_sweep_data,)
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_sweep, initargs=initargs) as executor:
+            return list(executor.map(func, tasks, chunksize=chunksize))
+
+    root = logging.getLogger()
+    level = root.level
+    root.setLevel(logging.WARNING)
+    try:
+        return [func(task) for task in tasks]
+    finally:
+        root.setLevel(level)
+
+def _backtest(params, dates=None):
+    """用共享数据运行一组参数的回测，dates 默认为所有日期，返回参数和性能指标"""
+    coin_data, all_dates, signal_matrix, price_matrix, initial_capital = _sweep_data
+    backtester = Backtester(coin_data, initial_capital=initial_capital, log_output=None, **params)
+    backtester.signal_matrix = signal_matrix
+    backtester.price_matrix = price_matrix
+    backtester.run_backtest(all_dates if dates is None else dates)
+    result = {
+        **params,
+        **backtester.performance_metrics,
+        'orders': len(backtester.trades_history),
+        'final_value': backtester.final_value
+    }
+    # 没有完整交易时 performance_metrics 为空，收益率仍然有意义
+    result.setdefault('total_return', (backtester.final_value - initial_capital) / initial_capital)
+    return result
+
+def _run_combination(params):
+    return _backtest(params)
+
+def expand_param_grid(grid):
+    """
+    把参数网格展开为参数组合列表
+
+    参数:
+        grid (dict): {参数名: 取值或取值列表}，参数名见 SWEEP_PARAMS
+    """
+    unknown = set(grid) - set(SWEEP_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {', '.join(sorted(unknown))}")
+    names = list(grid)
+    values = [v if isinstance(v, list) else [v] for v in grid.values()]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+def run_sweep(coin_data, grid, workers=1, initial_capital=10000):
+    """
+    参数扫描：在进程池中运行网格中的所有参数组合
+
+    数据和信号矩阵只在父进程中加载和计算一次，子进程以只读方式共享。
+
+    返回:
+        DataFrame: 每组参数一行，包含参数、性能指标、订单数和最终价值
+    """
+    combinations = expand_param_grid(grid)
+    _prepare_shared(coin_data, initial_capital)
+    started = time.perf_counter()
+
+    rows = _map_shared(_run_combination, combinations, workers)
+
+    logging.info(f"Swept {len(combinations)} parameter combinations with {workers} workers "
+                 f"in {time.perf_counter() - started:.1f}s")
+    return pd.DataFrame(rows)
+
+def walk_forward_folds(dates, train_days, test_days, step_days=None):
+    """
+    滚动窗口划分：每折为 train_days 天的样本内窗口，紧接着 test_days 天的样本外窗口，
+    窗口每次向后移动 step_days 天（默认等于 test_days，样本外窗口首尾相接）
+
+    按日历天数而不是日期个数划分，最后一天的各个实时数据点落在同一个窗口中。
+
+    返回:
+        list: [(样本内日期, 样本外日期), ...]
+    """
+    if not dates:
+        return []
+    step_days = step_days or test_days
+    index = pd.DatetimeIndex(dates)
+    end = index[-1] + pd.Timedelta(days=1)
+    folds = []
+    start = index[0]
+    while start + pd.Timedelta(days=train_days + test_days) <= end:
+        split = start + pd.Timedelta(days=train_days)
+        stop = split + pd.Timedelta(days=test_days)
+        i, j, k = index.searchsorted([start, split, stop])
+        if i < j < k:
+            folds.append((dates[i:j], dates[j:k]))
+        start += pd.Timedelta(days=step_days)
+    return folds
+
+def _select(results, metric):
+    """按 metric 选出样本内表现最好的结果（缺失值视为最差，全部缺失时取第一组）"""
+    best = results[0]
+    best_value = -np.inf
+    for result in results:
+        value = result.get(metric, np.nan)
+        if value is not None and not pd.isna(value) and value > best_value:
+            best, best_value = result, value
+    return best
+
+def _run_fold(task):
+    """
+    运行一折：在样本内窗口上回测所有参数组合，选出 select 指标最好的一组，再在样本外窗口上回测
+    """
+    fold, (train_dates, test_dates), combinations, select = task
+    in_sample = _select([_backtest(params, train_dates) for params in combinations], select)
+    params = {name: in_sample[name] for name in combinations[0]}
+    out_of_sample = _backtest(params, test_dates)
+
+    row = {
+        'fold': fold,
+        'is_start': train_dates[0],
+        'is_end': train_dates[-1],
+        'oos_start': test_dates[0],
+        'oos_end': test_dates[-1],
+        **params
+    }
+    row.update({f"is_{k}": v for k, v in in_sample.items() if k not in params})
+    row.update({f"oos_{k}": v for k, v in out_of_sample.items() if k not in params})
+    return row
+
+def walk_forward_summary(folds):
+    """汇总各折的样本外表现"""
+    returns = folds['oos_total_return']
+    summary = {
+        'folds': len(folds),
+        'profitable_folds': int((returns > 0).sum()),
+        'compounded_return': float((1 + returns).prod() - 1),
+        'mean_return': returns.mean(),
+        'median_return': returns.median(),
+        'worst_return': returns.min(),
+        'best_return': returns.max()
+    }
+    for metric in ('total_trades', 'orders'):
+        column = f"oos_{metric}"
+        if column in folds:
+            summary[metric] = int(folds[column].fillna(0).sum())
+    for metric in ('win_rate', 'max_drawdown', 'sharpe_ratio'):
+        column = f"oos_{metric}"
+        if column in folds:
+            summary[f"mean_{metric}"] = folds[column].mean()
+    return summary
+
+def run_walk_forward(coin_data, train_days, test_days, step_days=None, grid=None,
+                     select='total_return', workers=1, initial_capital=10000):
+    """
+    滚动前推回测：每一折作为独立任务在进程池中运行，共享同一份数据和评分矩阵
+
+    参数:
+        grid (dict): 样本内参数网格（格式同 run_sweep），为空时使用默认参数，只评估样本外表现
+        select (str): 样本内选择参数使用的指标（calculate_performance_metrics 中的字段）
+
+    返回:
+        (DataFrame, dict): 每折一行的样本内/样本外指标，以及样本外表现的汇总
+    """
+    combinations = expand_param_grid(grid) if grid else [{}]
+    dates = _prepare_shared(coin_data, initial_capital)
+    folds = walk_forward_folds(dates, train_days, test_days, step_days)
+    if not folds:
+        raise ValueError(f"Not enough dates ({len(dates)}) for a {train_days} + {test_days} day fold")
+    started = time.perf_counter()
+
+    tasks = [(i + 1, fold, combinations, select) for i, fold in enumerate(folds)]
+    results = pd.DataFrame(_map_shared(_run_fold, tasks, workers))
+    summary = walk_forward_summary(results)
+
+    logging.info(f"Ran {len(folds)} walk-forward folds x {len(combinations)} parameter combinations "
+                 f"with {workers} workers in {time.perf_counter() - started:.1f}s")
+    return results, summary
+
 def main():
+    parser = argparse.ArgumentParser(description='Backtest the breakout strategy')
+    parser.add_argument('--sweep', metavar='GRID', help='JSON parameter grid, e.g. {"stop_loss": [0.05, 0.1], "buy_threshold": [6, 7]}')
+    parser.add_argument('--walk-forward', action='store_true',
+                        help='Walk-forward evaluation; with --sweep the grid is searched on each in-sample window')
+    parser.add_argument('--train-days', type=int, default=120, help='In-sample window of a walk-forward fold')
+    parser.add_argument('--test-days', type=int, default=30, help='Out-of-sample window of a walk-forward fold')
+    parser.add_argument('--step-days', type=int, help='Days between folds (default: --test-days)')
+    parser.add_argument('--select', default='total_return', help='In-sample metric used to pick parameters')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes to use for a sweep or walk-forward')
+    parser.add_argument('--output', help='Where to write the sweep / walk-forward results '
+                                         '(default sweep_results.csv / walk_forward.csv)')
+    parser.add_argument('--log-format', choices=['csv', 'parquet', 'none'], default='csv',
+                        help='Format of the trade / portfolio logs of a single run')
+    parser.add_argument('--flush-every', type=int, help='Flush the logs every N rows instead of once at the end')
+    args = parser.parse_args()
+
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(levelname)s - %(message)s'
@@ -486,20 +907,51 @@ def main():
         
         if not coin_data:
             raise ValueError("No data loaded")
+
+        grid = None
+        if args.sweep:
+            with open(args.sweep) as f:
+                grid = json.load(f)
+
+        if args.walk_forward:
+            output = args.output or 'walk_forward.csv'
+            results, summary = run_walk_forward(
+                coin_data, args.train_days, args.test_days, args.step_days,
+                grid=grid, select=args.select, workers=args.workers
+            )
+            results.to_csv(output, index=False)
+            summary_file = f"{os.path.splitext(output)[0]}_summary.csv"
+            with open(summary_file, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['Metric', 'Value'])
+                for metric, value in summary.items():
+                    writer.writerow([metric, f"{value:.4f}" if isinstance(value, float) else value])
+            logging.info("Walk-forward summary:\n" + "\n".join(f"{k}: {v}" for k, v in summary.items()))
+            logging.info(f"Walk-forward results saved to {output} and {summary_file}")
+            return
+
+        if grid:
+            output = args.output or 'sweep_results.csv'
+            results = run_sweep(coin_data, grid, workers=args.workers)
+            results.to_csv(output, index=False)
+            logging.info(f"Sweep results saved to {output}")
+            return
             
         # 初始化回测器
         backtester = Backtester(
             coin_data=coin_data,
             initial_capital=10000,
             stop_loss=0.1,
-            take_profit=0.2
+            take_profit=0.2,
+            log_output=None if args.log_format == 'none' else args.log_format,
+            flush_every=args.flush_every
         )
         
         # 运行回测
         backtester.run_backtest()
         
         # 输出结果
-        final_value = backtester.portfolio_history[-1]['value']
+        final_value = backtester.final_value
         total_return = (final_value - backtester.initial_capital) / backtester.initial_capital * 100
         
         logging.info(f"""
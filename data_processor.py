@@ -12,32 +12,113 @@ from functools import wraps
 import random
 import csv
 import argparse
-from datetime import datetime
+import asyncio
+import threading
+import httpx
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from http_cache import ResponseCache
+from storage import HistoryStore
+from panel import PANEL_DIR, load_panel, open_panel, publish_from_store
+from sqlite_store import get_sqlite_store
+from scoring import score_panel
+from indicator_state import IndicatorStateStore
+from features import save_features
+from signals import compute_signals, publish_signals
 
 # 初始化配置
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
-API_BASE_URL = "https://api.coingecko.com/api/v3"
+API_BASE_URL = os.getenv("COINGECKO_API_BASE_URL", "https://api.coingecko.com/api/v3")
 API_KEY = os.getenv("COINGECKO_API_KEY")
 
-if not API_KEY:
-    logger.error("API key not found. Please make sure COINGECKO_API_KEY is set in your .env file.")
-    exit(1)
+# 请求配额：每分钟请求数与同时在途的请求数
+REQUESTS_PER_MINUTE = int(os.getenv("COINGECKO_RPM", 30))
+MAX_CONCURRENCY = int(os.getenv("COINGECKO_CONCURRENCY", 8))
+
+# 连接池大小和重试策略，同步和异步请求共用
+POOL_SIZE = int(os.getenv("COINGECKO_POOL_SIZE", 10))
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 5
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+# 保存的历史数据天数
+HISTORY_DAYS = 360
+DAY_MS = 24 * 60 * 60 * 1000
+HISTORY_DIR = os.getenv("COINGECKO_HISTORY_DIR", "data/history")
+
+def require_api_key():
+    """请求 CoinGecko 接口前检查 API key；只做分析、离线验证或完全使用缓存时不需要"""
+    if not API_KEY:
+        logger.error("API key not found. Please make sure COINGECKO_API_KEY is set in your .env file.")
+        exit(1)
 
 class CoinGeckoAPI:
     """处理所有 CoinGecko API 相关的请求"""
     
-    @staticmethod
-    def get_session():
-        """创建一个带有重试机制的会话"""
-        session = requests.Session()
-        retry = Retry(total=5, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retry)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        return session
+    _session = None
+    _session_lock = threading.Lock()
+    cache = ResponseCache.from_env()
+
+    @classmethod
+    def _get_json(cls, url, params):
+        """优先从磁盘缓存读取，未命中时请求接口并写入缓存"""
+        data = cls.cache.get(url, params)
+        if data is not None:
+            return data
+        if cls.cache.offline:
+            logger.warning(f"Cache miss for {url} in cache-only mode")
+            return None
+        require_api_key()
+        response = cls.get_session().get(url, params=params, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        cls.cache.put(url, params, data)
+        return data
+
+    @classmethod
+    def get_session(cls):
+        """获取进程内共享的会话，保持长连接并带有重试机制"""
+        with cls._session_lock:
+            if cls._session is None:
+                session = requests.Session()
+                retry = Retry(
+                    total=MAX_RETRIES,
+                    backoff_factor=RETRY_BASE_DELAY,
+                    status_forcelist=RETRY_STATUS_CODES,
+                    respect_retry_after_header=True
+                )
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                cls._session = session
+            return cls._session
+
+    @classmethod
+    def connection_stats(cls):
+        """统计连接池新建和复用的连接数"""
+        stats = {'requests': 0, 'opened': 0, 'reused': 0}
+        if cls._session is None:
+            return stats
+        for adapter in set(cls._session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                stats['requests'] += pool.num_requests
+                stats['opened'] += pool.num_connections
+        stats['reused'] = stats['requests'] - stats['opened']
+        return stats
+
+    @classmethod
+    def close_session(cls):
+        """关闭共享会话"""
+        with cls._session_lock:
+            if cls._session is not None:
+                cls._session.close()
+                cls._session = None
 
     @classmethod
     def get_top_coins(cls, start, end):
@@ -53,16 +134,13 @@ class CoinGeckoAPI:
         }
         
         try:
-            session = cls.get_session()
-            response = session.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
+            return cls._get_json(url, params)
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching data from CoinGecko: {e}")
             return None
 
     @classmethod
-    def get_historical_data(cls, coin_id, days=360, max_retries=5, base_delay=5):
+    def get_historical_data(cls, coin_id, days=HISTORY_DAYS):
         """获取币种的历史数据"""
         url = f"{API_BASE_URL}/coins/{coin_id}/market_chart"
         params = {
@@ -72,27 +150,276 @@ class CoinGeckoAPI:
             "x_cg_demo_api_key": API_KEY
         }
         
-        for attempt in range(max_retries):
+        try:
+            data = cls._get_json(url, params)
+            return json.dumps(data) if data is not None else None
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error fetching historical data for {coin_id}: {e}")
+            return None
+
+class TokenBucket:
+    """令牌桶限速器，所有并发请求共享同一份每分钟配额"""
+
+    def __init__(self, rate_per_minute, burst=1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """等待直到拿到一个令牌"""
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self, seconds):
+        """遇到 429 时清空令牌，让所有请求一起暂停"""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+class AsyncCoinGeckoFetcher:
+    """并发获取 CoinGecko 数据，整体速度由令牌桶配额决定而不是固定的 sleep"""
+
+    def __init__(self, rate_per_minute=REQUESTS_PER_MINUTE, concurrency=MAX_CONCURRENCY,
+                 max_retries=MAX_RETRIES, base_delay=RETRY_BASE_DELAY, base_url=API_BASE_URL, burst=1,
+                 cache=None):
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.cache = cache if cache is not None else CoinGeckoAPI.cache
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.base_url = base_url
+        self.request_count = 0
+        self.connections_opened = 0
+
+    async def _trace(self, event_name, info):
+        """记录新建的 TCP 连接，用于统计连接复用情况"""
+        if event_name == 'connection.connect_tcp.complete':
+            self.connections_opened += 1
+
+    def connection_stats(self):
+        """统计新建和复用的连接数"""
+        return {
+            'requests': self.request_count,
+            'opened': self.connections_opened,
+            'reused': self.request_count - self.connections_opened
+        }
+
+    async def _get_json(self, client, url, params, label):
+        """带限速和重试的 GET 请求，缓存命中时不占用请求配额"""
+        data = self.cache.get(url, params)
+        if data is not None:
+            return data
+        if self.cache.offline:
+            logger.warning(f"Cache miss for {label} in cache-only mode")
+            return None
+
+        for attempt in range(self.max_retries):
+            await self.bucket.acquire()
+            self.request_count += 1
             try:
-                response = requests.get(url, params=params)
-                
+                response = await client.get(url, params=params, extensions={'trace': self._trace})
+
                 if response.status_code == 429:
-                    retry_after = int(response.headers.get('Retry-After', base_delay * (2 ** attempt)))
-                    logger.warning(f"Rate limit hit for {coin_id}. Waiting {retry_after} seconds...")
-                    time.sleep(retry_after + random.uniform(1, 3))
+                    retry_after = int(response.headers.get('Retry-After', self.base_delay * (2 ** attempt)))
+                    logger.warning(f"Rate limit hit for {label}. Pausing all requests for {retry_after} seconds...")
+                    self.bucket.penalize(retry_after + random.uniform(1, 3))
                     continue
-                    
-                response.raise_for_status()
-                return json.dumps(response.json())
-                
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Error fetching historical data for {coin_id}: {e}")
-                if attempt < max_retries - 1:
-                    delay = base_delay * (2 ** attempt) + random.uniform(1, 5)
-                    logger.info(f"Retrying in {delay:.2f} seconds... (Attempt {attempt + 1}/{max_retries})")
-                    time.sleep(delay)
-                else:
-                    return None
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    data = response.json()
+                    self.cache.put(url, params, data)
+                    return data
+                logger.error(f"Error fetching {label}: HTTP {response.status_code}")
+
+            except httpx.HTTPStatusError as e:
+                logger.error(f"Error fetching {label}: {e}")
+                return None
+            except httpx.HTTPError as e:
+                logger.error(f"Error fetching {label}: {e}")
+            except ValueError as e:
+                # 状态码为 200 但响应体不是合法的 JSON（例如被截断），按临时错误重试
+                logger.error(f"Invalid JSON response for {label}: {e}")
+
+            if attempt < self.max_retries - 1:
+                delay = self.base_delay * (2 ** attempt) + random.uniform(1, 5)
+                logger.info(f"Retrying in {delay:.2f} seconds... (Attempt {attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+        return None
+
+    async def get_top_coins(self, client, start, end):
+        """获取排名靠前的币种"""
+        params = {
+            "vs_currency": "usd",
+            "order": "market_cap_desc",
+            "per_page": end-start+1,
+            "page": start//50 + 1,
+            "sparkline": False,
+            "x_cg_demo_api_key": API_KEY
+        }
+        return await self._get_json(client, f"{self.base_url}/coins/markets", params, f"coins {start}-{end}")
+
+    async def get_historical_data(self, client, coin_id, days=HISTORY_DAYS):
+        """获取币种的历史数据，返回 JSON 字符串"""
+        params = {
+            "vs_currency": "usd",
+            "days": days,
+            "interval": "daily",
+            "x_cg_demo_api_key": API_KEY
+        }
+        data = await self._get_json(client, f"{self.base_url}/coins/{coin_id}/market_chart", params, coin_id)
+        return json.dumps(data) if data is not None else None
+
+    async def fetch_all(self, batches, on_result, days=HISTORY_DAYS, days_for=None, skip=None):
+        """
+        获取所有批次的币种列表及其历史数据
+
+        每个币种的数据一到达就交给 on_result(coin, historical_data) 处理，不在内存中累积。
+
+        参数:
+            on_result (callable): 处理单个币种结果的回调，获取失败时 historical_data 为 None
+            days_for (callable): 根据币种 id 返回需要获取的天数，默认所有币种都获取 days 天
+            skip (callable): 返回 True 的币种不再请求（例如当天已经获取过）
+
+        返回:
+            list: 按排名排序的币种列表
+        """
+        pool_size = max(self.concurrency, POOL_SIZE)
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+            coin_lists = await asyncio.gather(*(self.get_top_coins(client, start, end) for start, end in batches))
+
+            coins = []
+            for (start, end), top_coins in zip(batches, coin_lists):
+                if top_coins is None:
+                    logger.error(f"Failed to fetch coins {start} to {end}. Skipping this batch.")
+                    continue
+                coins.extend(top_coins)
+
+            queue = asyncio.Queue()
+            for coin in coins:
+                if skip is None or not skip(coin['id']):
+                    queue.put_nowait(coin)
+            logger.info(f"{queue.qsize()} of {len(coins)} coins need fetching")
+
+            async def worker():
+                while not queue.empty():
+                    coin = queue.get_nowait()
+                    coin_days = days_for(coin['id']) if days_for else days
+                    historical_data = await self.get_historical_data(client, coin['id'], coin_days)
+                    try:
+                        on_result(coin, historical_data)
+                    except Exception as e:
+                        # 一个币种处理失败不能中断其他 worker，下次运行时该币种会重新获取
+                        logger.error(f"Error saving data for {coin['id']}: {e}")
+
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+        return coins
+
+    def run(self, batches, on_result, days=HISTORY_DAYS, days_for=None, skip=None):
+        """同步入口"""
+        started = time.monotonic()
+        coins = asyncio.run(self.fetch_all(batches, on_result, days, days_for, skip))
+        elapsed = time.monotonic() - started
+        stats = self.connection_stats()
+        logger.info(f"Listed {len(coins)} coins with {self.request_count} requests in {elapsed:.1f}s "
+                    f"({self.request_count / max(elapsed, 1e-9):.2f} req/s, "
+                    f"{stats['opened']} connections opened, {stats['reused']} reused, "
+                    f"{self.cache.hits} cache hits)")
+        return coins
+
+class FetchCheckpoint:
+    """
+    按币种落盘的历史数据和当天的抓取进度
+
+    每个币种的历史数据单独保存为 history_dir/<coin_id>.json，抓取成功后立即写入；
+    manifest.jsonl 是只追加的检查点，记录当天（UTC）已完成的币种，重启后跳过这些币种。
+    """
+
+    def __init__(self, history_dir=HISTORY_DIR):
+        self.history_dir = history_dir
+        self.manifest_file = os.path.join(history_dir, "manifest.jsonl")
+        self.today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        os.makedirs(history_dir, exist_ok=True)
+        self.fetched = self._load_manifest()
+
+    def _load_manifest(self):
+        """读取当天已完成的币种，旧日期的检查点直接清空"""
+        fetched = set()
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 进程中断时可能留下不完整的最后一行
+                    if entry.get('date') == self.today:
+                        fetched.add(entry['id'])
+        if not fetched:
+            open(self.manifest_file, 'w').close()
+        return fetched
+
+    def history_path(self, coin_id):
+        return os.path.join(self.history_dir, f"{coin_id}.json")
+
+    def load(self, coin_id):
+        """读取单个币种已保存的历史数据（JSON 字符串），不存在时返回 None"""
+        path = self.history_path(coin_id)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read()
+
+    def save(self, coin, historical_data):
+        """原子写入单个币种的历史数据并记录检查点"""
+        path = self.history_path(coin['id'])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(historical_data)
+        os.replace(tmp_path, path)
+
+        with open(self.manifest_file, 'a') as f:
+            f.write(json.dumps({'date': self.today, 'id': coin['id'], 'fetched_at': time.time()}) + '\n')
+        self.fetched.add(coin['id'])
+
+    def is_fetched(self, coin_id):
+        return coin_id in self.fetched
+
+    def reset(self):
+        """清空当天的检查点，强制重新获取所有币种"""
+        open(self.manifest_file, 'w').close()
+        self.fetched = set()
+
+    def seed_from_csv(self, data_file='data.csv'):
+        """首次使用时把已有的 data.csv 拆分成按币种保存的文件"""
+        if not os.path.exists(data_file):
+            return
+        if any(name.endswith('.json') for name in os.listdir(self.history_dir)):
+            return
+        csv.field_size_limit(2**31 - 1)
+        count = 0
+        with open(data_file, newline='') as f:
+            for row in csv.DictReader(f):
+                with open(self.history_path(row['id']), 'w') as out:
+                    out.write(row['historical_data'])
+                count += 1
+        logger.info(f"Seeded {count} coin histories from {data_file}")
+
+    def load_payload(self, coin_id):
+        """读取单个币种已保存的历史数据并解析为 dict"""
+        historical_data = self.load(coin_id)
+        return json.loads(historical_data) if historical_data is not None else None
 
 class DataProcessor:
     """数据处理和分析类"""
@@ -119,6 +446,40 @@ class DataProcessor:
         # 由于原始数据是 UTC 0点，转换后就是北京时间 8点的数据，无需额外处理
         return df
 
+    @staticmethod
+    def last_timestamp(data):
+        """返回历史数据中最新的时间戳（毫秒），没有数据时返回 None"""
+        prices = data.get("prices") or []
+        return prices[-1][0] if prices else None
+
+    @staticmethod
+    def missing_days(last_ts, now_ms=None):
+        """根据最后保存的时间戳计算需要补充获取的天数，多取一天用于覆盖当天的实时数据点"""
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        gap = max(0, now_ms - last_ts)
+        return min(HISTORY_DAYS, -(-gap // DAY_MS) + 1)
+
+    @staticmethod
+    def merge_history(old, new, days=HISTORY_DAYS):
+        """
+        将新获取的数据合并到已保存的历史数据中
+
+        新数据覆盖从其第一个时间戳开始的所有旧数据（包括旧的当天实时数据点），
+        按时间戳去重后只保留最近 days+1 个数据点，与完整获取的结果长度一致。
+        """
+        merged = {}
+        for key in ("prices", "market_caps", "total_volumes"):
+            old_points = old.get(key) or []
+            new_points = new.get(key) or []
+            if new_points:
+                cutoff = new_points[0][0]
+                old_points = [p for p in old_points if p[0] < cutoff]
+            points = {p[0]: p for p in old_points}
+            points.update((p[0], p) for p in new_points)
+            merged[key] = [points[ts] for ts in sorted(points)][-(days + 1):]
+        return merged
+
     @staticmethod
     def calculate_indicators(data):
         """
@@ -263,61 +624,77 @@ class DataProcessor:
         
         return scores
 
-def fetch_and_save_data(batches):
-    """获取并保存数据"""
-    all_coin_data = []
-    for start, end in batches:
-        logger.info(f"Fetching data for coins {start} to {end}")
-        top_coins = CoinGeckoAPI.get_top_coins(start, end)
-        
-        if top_coins is None:
-            logger.error(f"Failed to fetch coins {start} to {end}. Skipping this batch.")
-            continue
-        
-        for coin in top_coins:
-            historical_data = CoinGeckoAPI.get_historical_data(coin['id'])
-            if historical_data is not None:
-                coin_data = {
-                    'id': coin['id'],
-                    'symbol': coin['symbol'],
-                    'name': coin['name'],
-                    'historical_data': historical_data
-                }
-                all_coin_data.append(coin_data)
-            else:
-                logger.warning(f"Skipping {coin['id']} due to missing historical data.")
-            
-            time.sleep(random.uniform(2, 4))
-        
-        time.sleep(random.uniform(5, 10))
-    
-    df = pd.DataFrame(all_coin_data)
-    df.to_csv('data.csv', index=False)
-    logger.info("All data fetched and saved to data.csv")
+def fetch_and_save_data(batches, rate_per_minute=REQUESTS_PER_MINUTE, concurrency=MAX_CONCURRENCY,
+                        full_refresh=False):
+    """
+    获取并保存数据
 
-def analyze_data(coin_range='1-300'):
-    """分析数据"""
-    start, end = map(int, coin_range.split('-'))
-    
-    df = pd.read_csv('data.csv')
-    df['rank'] = list(range(1, len(df) + 1))
-    df = df[(df['rank'] >= start) & (df['rank'] <= end)]
-    
+    默认只获取每个币种自上次保存以来缺失的数据并合并到已有历史中，
+    新上市的币种或 full_refresh=True 时获取完整的 HISTORY_DAYS 天数据。
+    每个币种获取后立即落盘，中断重启后当天已完成的币种不会重复获取。
+    """
+    logger.info(f"Fetching data for batches {batches} "
+                f"({rate_per_minute} req/min, {concurrency} concurrent requests, "
+                f"{'full' if full_refresh else 'incremental'} refresh)")
+    if not CoinGeckoAPI.cache.offline:
+        require_api_key()
+    fetcher = AsyncCoinGeckoFetcher(rate_per_minute=rate_per_minute, concurrency=concurrency)
+    checkpoint = FetchCheckpoint()
+    checkpoint.seed_from_csv()
+    db = get_sqlite_store()
+    if full_refresh:
+        checkpoint.reset()
+
+    def days_for(coin_id):
+        stored = None if full_refresh else checkpoint.load(coin_id)
+        if stored is not None:
+            last_ts = DataProcessor.last_timestamp(json.loads(stored))
+            if last_ts is not None:
+                return DataProcessor.missing_days(last_ts)
+        return HISTORY_DAYS
+
+    def on_result(coin, historical_data):
+        stored = None if full_refresh else checkpoint.load(coin['id'])
+        if historical_data is None:
+            if stored is not None:
+                logger.warning(f"Keeping stored history for {coin['id']} after failed incremental fetch.")
+            return
+        new_data = json.loads(historical_data)
+        if stored is not None:
+            merged = DataProcessor.merge_history(json.loads(stored), new_data)
+            historical_data = json.dumps(merged)
+        checkpoint.save(coin, historical_data)
+        if db is not None and db.latest_ts(coin['id']) is not None:
+            db.upsert_prices(coin['id'], new_data)
+
+    coins = fetcher.run(batches, on_result, days_for=days_for, skip=checkpoint.is_fetched)
+    store = HistoryStore()
+    count = store.write(coins, checkpoint.load_payload)
+    publish_from_store(store)
+    if db is not None:
+        # 数据库里还没有的币种（新币种或刚启用 SQLite）写入完整历史
+        for coin in coins:
+            if db.latest_ts(coin['id']) is None:
+                payload = checkpoint.load_payload(coin['id'])
+                if payload is not None:
+                    db.upsert_prices(coin['id'], payload)
+        db.upsert_coins(store.read_coins().to_dict('records'))
+    logger.info(f"All data fetched and saved to {store.store_dir} ({count} coins)")
+
+def analyze_coins(panel, coins, with_features=False):
+    """
+    计算一组币种的指标，返回按输入顺序排列的结果
+
+    参数:
+        with_features (bool): 同时返回这组币种的原始特征表（calculate_indicators 不输出原始特征，
+                              由批量引擎只对这组币种计算），返回 (结果, 特征)
+    """
     results = []
-    for _, row in df.iterrows():
+    for row in coins:
         logger.info(f"Processing {row['name']}")
         
-        historical_data = json.loads(row['historical_data'])
-        
-        # 使用 process_data 处理价格数据
-        prices_df = DataProcessor.process_data({"prices": historical_data['prices']})
-        volumes_df = DataProcessor.process_data({"prices": historical_data['total_volumes']}).rename(columns={'price': 'volume'})
-        market_caps_df = DataProcessor.process_data({"prices": historical_data['market_caps']}).rename(columns={'price': 'market_cap'})
-        
-        # 合并所有数据
-        coin_data = prices_df.join(volumes_df['volume']).join(market_caps_df['market_cap'])
-        
-        indicators = DataProcessor.calculate_indicators(coin_data)
+        coin_data = panel.frame(row['id'])
+        indicators = DataProcessor.calculate_indicators(coin_data) if coin_data is not None else None
         if indicators is not None:
             results.append({
                 'id': row['id'],
@@ -328,11 +705,66 @@ def analyze_data(coin_range='1-300'):
             })
         else:
             logger.warning(f"Skipping {row['name']} due to insufficient data")
+    if with_features:
+        return results, score_panel(panel, coins, with_features=True)[1]
+    return results
+
+def _analyze_chunk(panel_dir, panel_index, coins):
+    """进程池任务：在子进程中映射同一版本的面板并计算一组币种，返回 (结果, 特征)"""
+    return analyze_coins(load_panel(panel_dir, panel_index), coins, with_features=True)
+
+def analyze_data(coin_range='1-300', workers=1, vectorized=False, incremental=False):
+    """
+    分析数据
+
+    参数:
+        workers (int): 大于 1 时把币种分块交给进程池并行计算，结果顺序和串行一致
+        vectorized (bool): 使用批量评分引擎一次计算所有币种，结果与逐个计算一致
+        incremental (bool): 使用持久化的指标状态，每个币种只推进新增的 K 线
+    """
+    start, end = map(int, coin_range.split('-'))
+    
+    panel = open_panel()
+    df = pd.DataFrame({'id': panel.coin_ids, 'symbol': panel.symbols, 'name': panel.names})
+    df['rank'] = list(range(1, len(df) + 1))
+    df = df[(df['rank'] >= start) & (df['rank'] <= end)]
+    coins = df.to_dict('records')
+    
+    if incremental:
+        state_store = IndicatorStateStore().load()
+        results_df, features = state_store.score_panel(panel, coins, with_features=True)
+        results = results_df.to_dict('records')
+        state_store.save()
+    elif vectorized:
+        results_df, features = score_panel(panel, coins, with_features=True)
+        results = results_df.to_dict('records')
+    else:
+        if workers > 1 and len(coins) > 1:
+            # 每个进程分到多个小块，避免个别慢币种拖慢整体
+            chunk_size = max(1, -(-len(coins) // (workers * 4)))
+            chunks = [coins[i:i + chunk_size] for i in range(0, len(coins), chunk_size)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_analyze_chunk, PANEL_DIR, panel.index, chunk) for chunk in chunks]
+                chunk_results = [future.result() for future in futures]
+            results = [result for chunk, _ in chunk_results for result in chunk]
+            features = pd.concat([features for _, features in chunk_results], ignore_index=True)
+        else:
+            results, features = analyze_coins(panel, coins, with_features=True)
     
     results_df = pd.DataFrame(results)
-    results_df.to_csv('coin_scores.csv', index=False)
+    # 写入临时文件后原子替换，Web 服务和 Bot 不会读到写了一半的文件
+    results_df.to_csv('coin_scores.csv.tmp', index=False)
+    os.replace('coin_scores.csv.tmp', 'coin_scores.csv')
+    save_features(features)
+
+    db = get_sqlite_store()
+    if db is not None:
+        db.upsert_scores(datetime.now(timezone.utc).strftime('%Y-%m-%d'), results)
     logger.info(f"Analysis completed for range {coin_range}. Results saved to coin_scores.csv")
 
+    # 评分更新后发布一次交易信号快照，Web 服务和 Bot 直接读取
+    publish_signals(compute_signals())
+
 def parse_batch(batch_str):
     """解析批次字符串"""
     start, end = map(int, batch_str.split('-'))
@@ -344,12 +776,28 @@ def main():
     parser.add_argument('ranges', nargs='*', help='Ranges of coins to process (e.g. 1-50 51-100)')
     parser.add_argument('--fetch', action='store_true', help='Fetch new data')
     parser.add_argument('--analyze', action='store_true', help='Analyze data')
+    parser.add_argument('--rpm', type=int, default=REQUESTS_PER_MINUTE, help='API requests per minute budget')
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY, help='Max requests in flight')
+    parser.add_argument('--full', action='store_true', help='Re-download full history instead of only missing days')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the on-disk response cache')
+    parser.add_argument('--cache-only', action='store_true', help='Serve every request from the cache, never hit the API')
+    parser.add_argument('--workers', type=int, default=1, help='Processes to use for analysis')
+    parser.add_argument('--vectorized', action='store_true', help='Score all coins at once with the batched engine')
+    parser.add_argument('--incremental', action='store_true', help='Advance the persisted indicator state by the new bars only')
     args = parser.parse_args()
 
+    if args.no_cache:
+        CoinGeckoAPI.cache.enabled = False
+    if args.cache_only:
+        CoinGeckoAPI.cache.enabled = True
+        CoinGeckoAPI.cache.offline = True
+
     if args.fetch:
-        fetch_and_save_data([parse_batch(batch) for batch in args.ranges])
+        fetch_and_save_data([parse_batch(batch) for batch in args.ranges],
+                            rate_per_minute=args.rpm, concurrency=args.concurrency,
+                            full_refresh=args.full)
     if args.analyze:
-        analyze_data()
+        analyze_data(workers=args.workers, vectorized=args.vectorized, incremental=args.incremental)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 检查数据是否更新的间隔（秒）
+EVENTS_POLL_SECONDS = float(os.getenv("COIN_EVENTS_POLL", 2))
+
+# 没有更新时发送心跳注释的间隔（秒），防止代理断开空闲连接
+KEEPALIVE_SECONDS = 15
+
+# 保留最近的消息数量，落后更多的连接收到 reset
+EVENT_HISTORY = 16
+
+# 每个进程同时订阅的连接数上限
+EVENTS_MAX_CLIENTS = int(os.getenv("COIN_EVENTS_MAX_CLIENTS", 1000))
+
+KEEPALIVE = b': keepalive\n\n'
+
+def format_event(event, data, event_id=None):
+    """序列化一条 Server-Sent Events 消息"""
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    message += f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+    return message.encode()
+
+class Broadcaster:
+    """
+    进程内所有 SSE 连接共享的广播器
+
+    后台线程每隔 interval 秒调用一次 poll() 获取当前状态 (state_id, state)；状态变化时调用一次
+    diff(previous, current) 并序列化成消息，所有连接发送同一份字节，每次更新的计算量与连接数无关。
+    """
+
+    def __init__(self, poll, diff, interval=EVENTS_POLL_SECONDS, history=EVENT_HISTORY,
+                 max_subscribers=EVENTS_MAX_CLIENTS):
+        self.poll = poll
+        self.diff = diff
+        self.interval = interval
+        self.history = history
+        self.max_subscribers = max_subscribers
+        self.reset()
+
+    def reset(self):
+        """
+        重新创建状态、锁和条件变量
+
+        gevent 工作进程在 fork 之后才打补丁，需要在工作进程初始化后调用一次，
+        让等待更新的连接使用协程友好的条件变量，而不是阻塞整个进程。
+        """
+        self.state_id = None
+        self.sequence = 0
+        self.subscribers = 0
+        self._state = None
+        self._events = deque(maxlen=self.history)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def acquire(self):
+        """占用一个订阅名额，已满时返回 False（订阅连接不能占满处理普通请求的线程）"""
+        with self._cond:
+            if self.subscribers >= self.max_subscribers:
+                return False
+            self.subscribers += 1
+            return True
+
+    def release(self):
+        """连接关闭时归还订阅名额"""
+        with self._cond:
+            self.subscribers -= 1
+
+    def start(self):
+        """第一次订阅时启动轮询线程（fork 之后在每个工作进程中各启动一次）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self.refresh()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error polling for updates: {e}")
+
+    def refresh(self):
+        """检查状态是否变化，变化时生成一条 update 消息并唤醒所有连接"""
+        state_id, state = self.poll()
+        if state_id == self.state_id:
+            return False
+        with self._cond:
+            # 订阅请求和轮询线程可能同时发现同一个新版本，只处理一次
+            if state_id == self.state_id:
+                return False
+            if self._state is not None:
+                payload = dict(self.diff(self._state, state), id=state_id)
+                self.sequence += 1
+                self._events.append((self.sequence, format_event('update', payload, state_id)))
+                logger.info(f"Broadcasting update {state_id}")
+            self.state_id, self._state = state_id, state
+            self._cond.notify_all()
+        return True
+
+    def subscribe(self, since=None):
+        """
+        一个连接的消息流，调用前需要先 acquire() 占用名额
+
+        参数:
+            since (str): 客户端已有状态的 id，与当前状态不同时先发送 reset（客户端重新加载）
+        """
+        self.start()
+        # 先检查一次最新状态：页面可能由比上一次轮询更新的版本渲染，
+        # 直接和轮询结果比较会让客户端收到旧版本的 reset 并反复重新加载
+        self.refresh()
+        with self._cond:
+            sequence, state_id = self.sequence, self.state_id
+        if since and since != state_id:
+            yield format_event('reset', {'id': state_id}, state_id)
+        else:
+            # 先发送一条注释，客户端立即收到响应头
+            yield KEEPALIVE
+
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.sequence != sequence, timeout=KEEPALIVE_SECONDS)
+                events = [message for number, message in self._events if number > sequence]
+                missed = bool(self._events) and self._events[0][0] > sequence + 1
+                sequence, state_id = self.sequence, self.state_id
+            if not events:
+                yield KEEPALIVE
+            elif missed:
+                yield format_event('reset', {'id': state_id}, state_id)
+            else:
+                yield b''.join(events)
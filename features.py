@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import logging
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scoring import DEFAULT_RULES, DEFAULT_WEIGHTS, MAX_SCORE, apply_rules
+
+logger = logging.getLogger(__name__)
+
+FEATURES_FILE = os.getenv("COIN_FEATURES_FILE", "data/features.parquet")
+
+# 与回测和交易建议一致的买入阈值（total_score > 7）
+BUY_THRESHOLD = 7
+
+def save_features(df, path=FEATURES_FILE):
+    """保存分析得到的原始特征表"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    logger.info(f"Saved features for {len(df)} coins to {path}")
+
+def load_features(path=FEATURES_FILE):
+    """读取原始特征表，列为 id, symbol, name, rank 和 scoring.FEATURE_COLUMNS"""
+    return pq.read_table(path).to_pandas()
+
+def check_weights(weights):
+    """
+    检查一组权重：只能包含 DEFAULT_RULES 中的分项，权重之和不能为 0
+
+    异常:
+        ValueError: 出现未知的分项或权重之和为 0
+    """
+    for name in weights:
+        if name not in DEFAULT_RULES:
+            raise ValueError(f"Unknown score in weights: {name}")
+    if sum(weights.values()) == 0:
+        raise ValueError("Weights must not sum to zero")
+    return weights
+
+def load_config(path=None):
+    """
+    读取评分配置，未指定的部分使用默认值
+
+    配置为 JSON，例如：
+        {"weights": {"rsi_score": 2}, "rules": {"breakout_score": {"slope": 0.5}},
+         "max_score": 10, "buy_threshold": 7}
+    weights 中出现的分项会覆盖默认权重，权重为 0 表示不计入；rules 按分项合并到默认规则上。
+    """
+    config = {}
+    if path:
+        with open(path) as f:
+            config = json.load(f)
+    weights = check_weights(dict(DEFAULT_WEIGHTS, **config.get("weights", {})))
+    for name in config.get("rules", {}):
+        if name not in DEFAULT_RULES:
+            raise ValueError(f"Unknown score in rules: {name}")
+    rules = {name: dict(rule, **config.get("rules", {}).get(name, {})) for name, rule in DEFAULT_RULES.items()}
+    return {
+        "weights": weights,
+        "rules": rules,
+        "max_score": config.get("max_score", MAX_SCORE),
+        "buy_threshold": config.get("buy_threshold", BUY_THRESHOLD)
+    }
+
+def rescore(features, weights=None, rules=None, max_score=MAX_SCORE, buy_threshold=BUY_THRESHOLD):
+    """
+    用新的权重和规则对特征表重新评分，一次向量化计算
+
+    默认配置下各分项评分和 total_score 与分析生成的 coin_scores.csv 完全一致。
+
+    返回:
+        DataFrame: id, symbol, name, rank, 各分项评分, total_score, signal（total_score > buy_threshold）
+    """
+    weights = DEFAULT_WEIGHTS if weights is None else check_weights(weights)
+    scores = apply_rules(features, rules, max_score)
+    df = features[['id', 'symbol', 'name', 'rank']].copy()
+    for name, values in scores.items():
+        df[name] = values
+    total = 0
+    for key, weight in weights.items():
+        total = total + scores[key] * weight
+    df['total_score'] = total / sum(weights.values())
+    df['signal'] = df['total_score'] > buy_threshold
+    return df
+
+def rescore_many(features, weight_sets, rules=None, max_score=MAX_SCORE):
+    """
+    同一套规则下批量计算多组权重的总分
+
+    分项评分只计算一次，所有权重组合通过一次矩阵乘法得到。
+
+    参数:
+        weight_sets (list): 权重字典列表，未出现的分项权重为 0（与 rescore 一致）
+
+    返回:
+        np.ndarray: (币种, 权重组合) 的 total_score
+    """
+    for weights in weight_sets:
+        check_weights(weights)
+    scores = apply_rules(features, rules, max_score)
+    names = list(scores)
+    components = np.column_stack([scores[name] for name in names]).astype(np.float64)
+    weights = np.array([[w.get(name, 0.0) for name in names] for w in weight_sets], dtype=np.float64).T
+    return components @ weights / weights.sum(axis=0)
+
+def expand_grid(grid):
+    """
+    把参数网格展开为权重组合列表
+
+    参数:
+        grid (dict): {分项评分名: 权重或权重列表}，未出现的分项使用默认权重
+    """
+    names = list(grid)
+    values = [v if isinstance(v, list) else [v] for v in grid.values()]
+    return [dict(DEFAULT_WEIGHTS, **dict(zip(names, combo))) for combo in itertools.product(*values)]
+
+def sweep_summary(features, weight_sets, totals, buy_threshold=BUY_THRESHOLD, top=5):
+    """每组权重的信号数量和得分最高的币种"""
+    symbols = features['symbol'].str.upper().to_numpy()
+    top = min(top, len(features))
+    rows = []
+    for k, weights in enumerate(weight_sets):
+        column = totals[:, k]
+        best = np.argpartition(-column, top - 1)[:top] if top else np.array([], dtype=int)
+        best = best[np.argsort(-column[best], kind='stable')]
+        rows.append({
+            **weights,
+            'signals': int((column > buy_threshold).sum()),
+            'best_score': float(column.max()) if len(column) else np.nan,
+            'top': ' '.join(symbols[best])
+        })
+    return pd.DataFrame(rows)
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Re-score the saved feature table under new weights and thresholds')
+    parser.add_argument('--features', default=FEATURES_FILE, help='Feature table written by the analysis')
+    parser.add_argument('--config', help='JSON config with weights / rules / max_score / buy_threshold')
+    parser.add_argument('--grid', help='JSON grid of weights ({"rsi_score": [0.5, 1, 2], ...}) to sweep')
+    parser.add_argument('--top', type=int, default=5, help='Top coins to list per weighting in a sweep')
+    parser.add_argument('--output', help='Where to write the rescored table (CSV)')
+    args = parser.parse_args()
+
+    features = load_features(args.features)
+    config = load_config(args.config)
+    started = time.perf_counter()
+
+    if args.grid:
+        with open(args.grid) as f:
+            weight_sets = expand_grid(json.load(f))
+        totals = rescore_many(features, weight_sets, config['rules'], config['max_score'])
+        df = sweep_summary(features, weight_sets, totals, config['buy_threshold'], args.top)
+        logger.info(f"Scored {len(features)} coins under {len(weight_sets)} weightings "
+                    f"in {time.perf_counter() - started:.3f}s")
+    else:
+        df = rescore(features, config['weights'], config['rules'], config['max_score'], config['buy_threshold'])
+        logger.info(f"Rescored {len(df)} coins in {time.perf_counter() - started:.3f}s, "
+                    f"{int(df['signal'].sum())} above {config['buy_threshold']}")
+
+    if args.output:
+        df.to_csv(args.output, index=False)
+        logger.info(f"Saved to {args.output}")
+    elif args.grid:
+        print(df.to_string(index=False))
+    else:
+        print(df.sort_values('total_score', ascending=False, kind='stable').head(20).to_string(index=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 24 * 60 * 60
+
+# 不参与缓存键计算的参数（API 密钥不能影响缓存命中）
+EXCLUDED_PARAMS = {"x_cg_demo_api_key", "x_cg_pro_api_key"}
+
+class ResponseCache:
+    """
+    CoinGecko 响应的磁盘缓存
+
+    - 以 URL 和参数（不含 API 密钥）的哈希作为文件名，内容为 gzip 压缩的 JSON
+    - 每个接口有不同的过期时间：markets 几分钟，market_chart 到下一个日线收盘（UTC 0 点）
+    - 总大小超过上限时按最近使用时间（文件 mtime）淘汰
+    - offline=True 时只从缓存读取，忽略过期时间，未命中也不会发起网络请求
+    """
+
+    def __init__(self, cache_dir="cache/http", max_bytes=200 * 1024 * 1024,
+                 markets_ttl=300, enabled=True, offline=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.markets_ttl = markets_ttl
+        self.enabled = enabled or offline
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.total_bytes = None
+
+    @staticmethod
+    def make_key(url, params=None):
+        """根据 URL 和参数生成缓存键"""
+        items = sorted((k, str(v)) for k, v in (params or {}).items() if k not in EXCLUDED_PARAMS)
+        raw = json.dumps([url, items], separators=(",", ":"))
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def expires_at(self, url, now=None):
+        """计算某个接口的响应过期时间"""
+        now = time.time() if now is None else now
+        if url.endswith("/market_chart"):
+            return (now // DAY_SECONDS + 1) * DAY_SECONDS
+        return now + self.markets_ttl
+
+    def get(self, url, params=None):
+        """读取缓存，未命中或已过期时返回 None"""
+        if not self.enabled:
+            return None
+        path = self._path(self.make_key(url, params))
+        try:
+            with gzip.open(path, "rt") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if not self.offline and entry["expires_at"] <= time.time():
+            self.misses += 1
+            return None
+
+        # 更新 mtime 作为 LRU 的最近使用时间
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry["body"]
+
+    def put(self, url, params, body):
+        """写入缓存"""
+        if not self.enabled or self.offline:
+            return
+        key = self.make_key(url, params)
+        path = self._path(key)
+        entry = {
+            "url": url,
+            "params": {k: v for k, v in (params or {}).items() if k not in EXCLUDED_PARAMS},
+            "stored_at": time.time(),
+            "expires_at": self.expires_at(url),
+            "body": body
+        }
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, "wt") as f:
+                json.dump(entry, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+            new_size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry for {url}: {e}")
+            return
+
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self._scan_size()
+            else:
+                self.total_bytes += new_size - old_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json.gz"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """按最近使用时间淘汰，直到总大小降到上限的 90%"""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        self.total_bytes = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for path, size, _ in entries:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+            removed += 1
+        logger.info(f"Evicted {removed} cache entries, cache size now {self.total_bytes / 1024 / 1024:.1f} MB")
+
+    def stats(self):
+        """缓存命中统计"""
+        return {"hits": self.hits, "misses": self.misses}
+
+    @classmethod
+    def from_env(cls):
+        """从环境变量创建缓存"""
+        return cls(
+            cache_dir=os.getenv("COINGECKO_CACHE_DIR", "cache/http"),
+            max_bytes=int(float(os.getenv("COINGECKO_CACHE_MAX_MB", 200)) * 1024 * 1024),
+            markets_ttl=int(os.getenv("COINGECKO_CACHE_MARKETS_TTL", 300)),
+            enabled=os.getenv("COINGECKO_CACHE", "1") != "0",
+            offline=os.getenv("COINGECKO_CACHE_ONLY", "0") == "1"
+        )
@@ -0,0 +1,372 @@
+import os
+import json
+import math
+import time
+import logging
+import argparse
+from collections import deque
+import numpy as np
+import pandas as pd
+from scoring import RSI_WINDOW, SCORE_COLUMNS, INT_COLUMNS, features_frame, panel_coins, score_windows, scores_frame
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = os.getenv("COIN_INDICATOR_STATE", "data/indicator_state.json")
+
+# 横盘窗口最长 90 天，计算窗口内第一天的收益率还需要前一天的价格
+PRICE_BUFFER = 91
+VOLUME_BUFFER = 90
+
+class RollingMean:
+    """
+    pandas rolling(window).mean() 的在线版本
+
+    每加入一个值 O(1)：环形缓冲区保存窗口内的值，Kahan 求和（加入和移除分别补偿），
+    并保留 pandas 对连续相同值和全正/全负窗口的修正，从同一个起点开始时结果逐位一致。
+    """
+
+    __slots__ = ("window", "values", "nobs", "neg_ct", "sum_x",
+                 "compensation_add", "compensation_remove", "same_count", "prev_value")
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.same_count = 0
+        self.prev_value = math.nan
+
+    def push(self, val):
+        if len(self.values) == self.window:
+            old = self.values[0]
+            y = -old - self.compensation_remove
+            t = self.sum_x + y
+            self.compensation_remove = t - self.sum_x - y
+            self.sum_x = t
+            self.nobs -= 1
+            if math.copysign(1.0, old) < 0:
+                self.neg_ct -= 1
+
+        self.values.append(val)
+        y = val - self.compensation_add
+        t = self.sum_x + y
+        self.compensation_add = t - self.sum_x - y
+        self.sum_x = t
+        self.nobs += 1
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct += 1
+        self.same_count = self.same_count + 1 if val == self.prev_value else 1
+        self.prev_value = val
+
+    def mean(self):
+        if self.nobs < self.window:
+            return math.nan
+        if self.same_count >= self.nobs:
+            return self.prev_value
+        result = self.sum_x / self.nobs
+        if self.neg_ct == 0 and result < 0:
+            return 0.0
+        if self.neg_ct == self.nobs and result > 0:
+            return 0.0
+        return result
+
+    def copy(self):
+        other = RollingMean.__new__(RollingMean)
+        for name in self.__slots__:
+            setattr(other, name, getattr(self, name))
+        other.values = deque(self.values, maxlen=self.window)
+        return other
+
+    def to_dict(self):
+        return {name: list(self.values) if name == "values" else getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        rolling = cls(data["window"])
+        for name in cls.__slots__:
+            setattr(rolling, name, data[name])
+        rolling.values = deque(data["values"], maxlen=rolling.window)
+        return rolling
+
+class IndicatorState:
+    """
+    单个币种的指标状态，每天加入一根 K 线只需要 O(1) 的更新
+
+    - RSI 的 14 日平均涨跌幅、MA20、MA60 使用 RollingMean
+    - 横盘和突破窗口使用最近 91 天价格、90 天成交量和 14 天 RSI 的环形缓冲区
+    - 与 calculate_indicators 一样跳过任一字段为 NaN 或无穷大的 K 线
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.last_ts = None
+        self.last_bar = None
+        self.market_cap = math.nan
+        self.prices = deque(maxlen=PRICE_BUFFER)
+        self.volumes = deque(maxlen=VOLUME_BUFFER)
+        self.rsi = deque(maxlen=RSI_WINDOW)
+        self.avg_gain = RollingMean(RSI_WINDOW)
+        self.avg_loss = RollingMean(RSI_WINDOW)
+        self.ma20 = RollingMean(20)
+        self.ma60 = RollingMean(60)
+
+    def advance(self, ts, price, volume, market_cap):
+        """加入一根 K 线"""
+        self.last_ts = int(ts)
+        self.last_bar = [float(price), float(volume), float(market_cap)]
+        price, volume, market_cap = self.last_bar
+        if not (math.isfinite(price) and math.isfinite(volume) and math.isfinite(market_cap)):
+            return
+
+        delta = price - self.prices[-1] if self.prices else math.nan
+        self.avg_gain.push(delta if delta > 0 else 0.0)
+        self.avg_loss.push(-(delta if delta < 0 else 0.0))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rs = np.float64(self.avg_gain.mean()) / np.float64(self.avg_loss.mean())
+            self.rsi.append(float(100 - (100 / (1 + rs))))
+        self.ma20.push(price)
+        self.ma60.push(price)
+        self.prices.append(price)
+        self.volumes.append(volume)
+        self.market_cap = market_cap
+        self.n += 1
+
+    def copy(self):
+        other = IndicatorState.__new__(IndicatorState)
+        other.__dict__.update(self.__dict__)
+        other.last_bar = list(self.last_bar) if self.last_bar is not None else None
+        other.prices = deque(self.prices, maxlen=PRICE_BUFFER)
+        other.volumes = deque(self.volumes, maxlen=VOLUME_BUFFER)
+        other.rsi = deque(self.rsi, maxlen=RSI_WINDOW)
+        for name in ("avg_gain", "avg_loss", "ma20", "ma60"):
+            setattr(other, name, getattr(self, name).copy())
+        return other
+
+    def to_dict(self):
+        data = dict(self.__dict__)
+        for name in ("prices", "volumes", "rsi"):
+            data[name] = list(data[name])
+        for name in ("avg_gain", "avg_loss", "ma20", "ma60"):
+            data[name] = data[name].to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.__dict__.update(data)
+        state.prices = deque(data["prices"], maxlen=PRICE_BUFFER)
+        state.volumes = deque(data["volumes"], maxlen=VOLUME_BUFFER)
+        state.rsi = deque(data["rsi"], maxlen=RSI_WINDOW)
+        for name in ("avg_gain", "avg_loss", "ma20", "ma60"):
+            setattr(state, name, RollingMean.from_dict(data[name]))
+        return state
+
+def _right_aligned(buffers, width):
+    out = np.full((len(buffers), width), np.nan)
+    for i, buffer in enumerate(buffers):
+        if buffer:
+            out[i, width - len(buffer):] = buffer
+    return out
+
+def score_states(states, n=None):
+    """
+    对一组指标状态同时评分
+
+    参数:
+        states (list): IndicatorState 列表
+        n (list): 每个币种当前历史中的有效天数，默认使用状态累计的天数
+
+    返回:
+        tuple: (scores, valid)，与 scoring.score_arrays 相同
+    """
+    n = np.array([s.n for s in states] if n is None else n, dtype=np.int64)
+    return score_windows(
+        _right_aligned([s.prices for s in states], PRICE_BUFFER),
+        _right_aligned([s.volumes for s in states], PRICE_BUFFER),
+        np.array([s.market_cap for s in states]),
+        n,
+        _right_aligned([s.rsi for s in states], PRICE_BUFFER),
+        np.array([s.ma20.mean() for s in states]),
+        np.array([s.ma60.mean() for s in states])
+    )
+
+class IndicatorStateStore:
+    """
+    持久化的所有币种指标状态
+
+    状态只包含到历史数据倒数第二根 K 线为止的数据；最后一根通常是盘中实时数据点，
+    第二天会被日线收盘数据替换，所以评分时只在状态的副本上临时加入。
+    已保存的最后一根 K 线在新历史中不存在或数值变化时，从完整历史重新构建该币种的状态。
+    """
+
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self.states = {}
+        self.rebuilt = 0
+        self.advanced = 0
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return self
+        self.states = {coin_id: IndicatorState.from_dict(state) for coin_id, state in data.items()}
+        return self
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump({coin_id: state.to_dict() for coin_id, state in self.states.items()}, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def _is_current(self, state, timestamps, values):
+        """已保存的最后一根 K 线是否仍然是当前历史中倒数第二根之前的同一根"""
+        if state is None or state.last_ts is None:
+            return None
+        pos = int(np.searchsorted(timestamps, state.last_ts))
+        if pos >= len(timestamps) - 1 or timestamps[pos] != state.last_ts:
+            return None
+        if not np.array_equal(values[pos], state.last_bar, equal_nan=True):
+            return None
+        return pos
+
+    def update(self, coin_id, timestamps, values):
+        """
+        用某个币种当前的完整历史推进状态
+
+        参数:
+            timestamps: int64[n] 毫秒时间戳，升序
+            values: float[n, 3]，列为 price, volume, market_cap
+
+        返回:
+            IndicatorState: 加入最后一根 K 线后的临时状态（不保存），没有数据时返回 None
+        """
+        if len(timestamps) == 0:
+            self.states.pop(coin_id, None)
+            return None
+        state = self.states.get(coin_id)
+        pos = self._is_current(state, timestamps, values)
+        if pos is None:
+            state = IndicatorState()
+            start = 0
+            self.rebuilt += 1
+        else:
+            start = pos + 1
+        for i in range(start, len(timestamps) - 1):
+            state.advance(timestamps[i], *values[i])
+            self.advanced += 1
+        self.states[coin_id] = state
+
+        current = state.copy()
+        current.advance(timestamps[-1], *values[-1])
+        return current
+
+    def score_panel(self, panel, coins=None, with_features=False):
+        """
+        推进面板中各币种的状态并评分，返回与 coin_scores.csv 格式相同的数据框
+
+        有效天数按当前历史统计（历史只保留最近 361 个数据点，最早的数据会被移出）。
+        with_features=True 时同时返回原始特征表。
+        """
+        coins = panel_coins(panel) if coins is None else coins
+        states, n = [], []
+        prices, volumes, caps = panel.field('price'), panel.field('volume'), panel.field('market_cap')
+        for coin in coins:
+            i = panel.coin_position(coin['id'])
+            ts = np.asarray(panel.timestamps[i])
+            rows = np.flatnonzero(ts >= 0)
+            values = np.column_stack([prices[i, rows], volumes[i, rows], caps[i, rows]]).astype(np.float64)
+            state = self.update(coin['id'], ts[rows], values)
+            states.append(state if state is not None else IndicatorState())
+            n.append(int(np.isfinite(values).all(axis=1).sum()))
+
+        scores, valid = score_states(states, n)
+        logger.info(f"Updated indicator state for {len(coins)} coins "
+                    f"({self.advanced} bars advanced, {self.rebuilt} rebuilt)")
+        if with_features:
+            return scores_frame(coins, scores, valid), features_frame(coins, scores, valid)
+        return scores_frame(coins, scores, valid)
+
+def verify(panel, days=30, rtol=1e-9):
+    """
+    模拟逐日更新：每个币种先用较早的历史构建状态，再一天一天推进，
+    每天都和 calculate_indicators 在同一段历史上的结果对比
+
+    返回:
+        int: 分项评分不一致或浮点指标超出容差的次数
+    """
+    from data_processor import DataProcessor
+
+    store = IndicatorStateStore(path=None)
+    mismatches = checks = 0
+    max_error = 0.0
+    prices, volumes, caps = panel.field('price'), panel.field('volume'), panel.field('market_cap')
+    started = time.perf_counter()
+    for coin_id in panel.coin_ids:
+        i = panel.coin_position(coin_id)
+        ts = np.asarray(panel.timestamps[i])
+        rows = np.flatnonzero(ts >= 0)
+        values = np.column_stack([prices[i, rows], volumes[i, rows], caps[i, rows]]).astype(np.float64)
+        frame = panel.frame(coin_id)
+        for end in range(max(1, len(rows) - days), len(rows) + 1):
+            state = store.update(coin_id, ts[rows[:end]], values[:end])
+            n = int(np.isfinite(values[:end]).all(axis=1).sum())
+            scores, valid = score_states([state], [n])
+            try:
+                expected = DataProcessor.calculate_indicators(frame.iloc[:end])
+            except (ValueError, OverflowError):
+                expected = None
+            checks += 1
+            if expected is None or not valid[0]:
+                if (expected is None) != (not valid[0]):
+                    logger.error(f"{coin_id} day {end}: validity differs")
+                    mismatches += 1
+                continue
+            for column in SCORE_COLUMNS:
+                a, b = scores[column][0], expected[column]
+                if column in INT_COLUMNS:
+                    ok = a == b
+                elif pd.isna(a) or pd.isna(b):
+                    ok = pd.isna(a) and pd.isna(b)
+                else:
+                    error = abs(a - b) / max(abs(b), 1e-12)
+                    max_error = max(max_error, error)
+                    ok = error <= rtol
+                if not ok:
+                    logger.error(f"{coin_id} day {end} {column}: state {a!r} != per-coin {b!r}")
+                    mismatches += 1
+                    break
+
+    logger.info(f"Verified {checks} daily updates over {len(panel.coin_ids)} coins in "
+                f"{time.perf_counter() - started:.1f}s: {mismatches} mismatches, "
+                f"max relative error {max_error:.2e}")
+    return mismatches
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Maintain incremental per-coin indicator state')
+    parser.add_argument('--verify', action='store_true', help='Replay recent days and compare against calculate_indicators')
+    parser.add_argument('--days', type=int, default=30, help='Days to replay in verify mode')
+    parser.add_argument('--output', default='coin_scores.csv', help='Where to write the scores')
+    args = parser.parse_args()
+
+    from panel import open_panel
+    panel = open_panel()
+    if args.verify:
+        raise SystemExit(1 if verify(panel, args.days) else 0)
+
+    started = time.perf_counter()
+    store = IndicatorStateStore().load()
+    df = store.score_panel(panel)
+    store.save()
+    df.to_csv(args.output, index=False)
+    logger.info(f"Scored {len(df)} coins in {time.perf_counter() - started:.3f}s, saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
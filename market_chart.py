@@ -0,0 +1,103 @@
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# market_chart 原始数据中的序列名和对应的列名
+SERIES = (("prices", "price"), ("total_volumes", "volume"), ("market_caps", "market_cap"))
+COLUMNS = [column for _, column in SERIES]
+
+def _as_pairs(points):
+    return np.asarray(points or [], dtype=np.float64).reshape(-1, 2)
+
+def parse_market_chart(payload):
+    """
+    一次性把 market_chart 原始数据解析为对齐的数组块
+
+    成交量和市值按价格的时间戳左连接对齐（时间戳一致时直接按列堆叠），缺失为 NaN。
+
+    返回:
+        tuple: (timestamps int64[n] 毫秒, values float64[n, 3]，列为 price, volume, market_cap)
+    """
+    prices = _as_pairs(payload.get("prices"))
+    price_ts = prices[:, 0]
+    values = np.full((len(prices), len(SERIES)), np.nan)
+    values[:, 0] = prices[:, 1]
+
+    for k, (key, _) in enumerate(SERIES[1:], 1):
+        series = _as_pairs(payload.get(key))
+        if len(series) == len(prices) and np.array_equal(series[:, 0], price_ts):
+            values[:, k] = series[:, 1]
+        elif len(series):
+            order = np.argsort(series[:, 0], kind="stable")
+            series_ts = series[order, 0]
+            # 时间戳重复时取最后一个
+            pos = np.searchsorted(series_ts, price_ts, side="right") - 1
+            found = (pos >= 0) & (series_ts[np.maximum(pos, 0)] == price_ts)
+            values[found, k] = series[order[pos[found]], 1]
+
+    return price_ts.astype(np.int64), values
+
+def market_chart_frame(payload):
+    """把 market_chart 原始数据解析为以北京时间为索引的数据框，只做一次时区转换"""
+    timestamps, values = parse_market_chart(payload)
+    index = pd.DatetimeIndex(
+        pd.to_datetime(timestamps, unit="ms", utc=True).tz_convert("Asia/Shanghai"), name="date"
+    )
+    return pd.DataFrame(values, index=index, columns=COLUMNS)
+
+def _legacy_frame(payload):
+    """旧的解析方式：三次 process_data 分别建表和时区转换，再做两次索引连接"""
+    frames = []
+    for key, column in SERIES:
+        df = pd.DataFrame(payload[key], columns=["timestamp", column])
+        df["date"] = pd.to_datetime(df["timestamp"], unit="ms").dt.tz_localize('UTC').dt.tz_convert('Asia/Shanghai')
+        df.set_index("date", inplace=True)
+        df.drop("timestamp", axis=1, inplace=True)
+        frames.append(df)
+    return frames[0].join(frames[1]["volume"]).join(frames[2]["market_cap"])
+
+def benchmark(payloads, repeat=3):
+    """对比旧的解析方式和单次解析的每个币种耗时"""
+    results = {}
+    for name, func in (("legacy", _legacy_frame), ("single_pass", market_chart_frame)):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for payload in payloads:
+                func(payload)
+            best = min(best, time.perf_counter() - started)
+        results[name] = best / max(len(payloads), 1) * 1e6
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark market_chart payload parsing')
+    parser.add_argument('files', nargs='*', help='Raw market_chart JSON files (e.g. data/history/*.json)')
+    parser.add_argument('--synthetic', type=int, default=300, help='Number of synthetic payloads when no files given')
+    args = parser.parse_args()
+
+    if args.files:
+        payloads = []
+        for path in args.files:
+            with open(path) as f:
+                payloads.append(json.load(f))
+    else:
+        rng = np.random.default_rng(0)
+        ts = (np.arange(361) * 86400000 + 1700000000000).tolist()
+        payloads = [
+            {key: [[t, float(v)] for t, v in zip(ts, rng.lognormal(size=361))] for key, _ in SERIES}
+            for _ in range(args.synthetic)
+        ]
+
+    # 确认两种方式结果一致
+    for payload in payloads[:10]:
+        pd.testing.assert_frame_equal(_legacy_frame(payload), market_chart_frame(payload), check_index_type=False)
+
+    results = benchmark(payloads)
+    print(f"{len(payloads)} payloads: legacy {results['legacy']:.0f} us/coin, "
+          f"single pass {results['single_pass']:.0f} us/coin "
+          f"({results['legacy'] / results['single_pass']:.1f}x faster)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 年化使用的周期数和年化无风险收益率，与 Backtester.calculate_sharpe_ratio 一致
+PERIODS_PER_YEAR = 252
+RISK_FREE_RATE = 0.02
+
+NS_PER_DAY = 86_400_000_000_000
+
+def _group_ranks(keys):
+    """每个元素在相同 key 中的序号（按原顺序从 0 开始）"""
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    ranks = np.empty(len(keys), dtype=np.int64)
+    ranks[order] = np.arange(len(keys)) - np.repeat(starts, counts)
+    return ranks
+
+def pair_trades(symbols, actions, prices, dates):
+    """
+    按币种先进先出配对买入和卖出：每个币种的第 k 次买入与第 k 次卖出配成一笔交易
+
+    参数按交易发生的顺序排列；结果按币种名排序，同一币种内按配对顺序排列，
+    与 Backtester 原来按 symbol 分组逐笔配对的顺序相同。
+
+    返回:
+        dict: buy_index, sell_index（在输入中的位置）, buy_price, sell_price, profit, holding_days
+    """
+    codes, _ = pd.factorize(np.asarray(symbols), sort=True)
+    actions = np.asarray(actions)
+    side = np.where(actions == 'buy', 0, np.where(actions == 'sell', 1, 2))
+    ranks = _group_ranks(codes.astype(np.int64) * 3 + side)
+    slots = codes.astype(np.int64) * (len(codes) + 1) + ranks
+
+    buy_index = np.flatnonzero(side == 0)
+    sell_index = np.flatnonzero(side == 1)
+    _, b, s = np.intersect1d(slots[buy_index], slots[sell_index], assume_unique=True, return_indices=True)
+    buy_index, sell_index = buy_index[b], sell_index[s]
+
+    prices = np.asarray(prices, dtype=np.float64)
+    times = pd.DatetimeIndex(dates).as_unit('ns').asi8
+    buy_price, sell_price = prices[buy_index], prices[sell_index]
+    return {
+        'buy_index': buy_index,
+        'sell_index': sell_index,
+        'buy_price': buy_price,
+        'sell_price': sell_price,
+        'profit': (sell_price - buy_price) / buy_price,
+        'holding_days': (times[sell_index] - times[buy_index]) // NS_PER_DAY
+    }
+
+def simple_returns(values):
+    """逐期收益率，与 pandas 的 pct_change() 一致，第一期为 NaN；values 可以是 (组合, 日期) 的二维数组"""
+    values = np.asarray(values, dtype=np.float64)
+    returns = np.full(values.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns[..., 1:] = values[..., 1:] / values[..., :-1] - 1
+    return returns
+
+def _nanmean(values):
+    """沿最后一维求均值，与 pandas 的 Series.mean() 一致（NaN 填 0 后求和）"""
+    mask = np.isnan(values)
+    count = (~mask).sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(mask, 0.0, values).sum(axis=-1) / count
+
+def _nanstd(values):
+    """沿最后一维求样本标准差（ddof=1），与 pandas 的 Series.std() 一致的两遍算法"""
+    mask = np.isnan(values)
+    count = (~mask).sum(axis=-1)
+    filled = np.where(mask, 0.0, values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg = filled.sum(axis=-1) / count
+        sqr = (avg[..., None] - filled) ** 2
+        sqr[mask] = 0.0
+        var = sqr.sum(axis=-1) / (count - 1)
+        var = np.where(count - 1 <= 0, np.nan, var)
+        return np.sqrt(var)
+
+def _scalar(values):
+    return values[()] if isinstance(values, np.ndarray) and values.ndim == 0 else values
+
+def max_drawdown(values):
+    """最大回撤：相对历史最高点的最大跌幅（不小于 0）"""
+    values = np.asarray(values, dtype=np.float64)
+    peak = np.maximum.accumulate(values, axis=-1)
+    return _scalar(np.maximum(((peak - values) / peak).max(axis=-1), 0.0))
+
+def sharpe_ratio(returns, risk_free_rate=RISK_FREE_RATE, periods=PERIODS_PER_YEAR):
+    """年化夏普比率，returns 中的 NaN 被忽略；少于 2 期或标准差为 0 时为 0"""
+    returns = np.asarray(returns, dtype=np.float64)
+    std = _nanstd(returns)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = np.sqrt(periods) * _nanmean(returns - risk_free_rate / periods) / std
+    ratio = np.where(std == 0, 0.0, ratio)
+    if returns.shape[-1] < 2:
+        ratio = np.zeros_like(ratio)
+    return _scalar(ratio)
+
+def sortino_ratio(returns, risk_free_rate=RISK_FREE_RATE, periods=PERIODS_PER_YEAR):
+    """年化索提诺比率：超额收益均值除以下行偏差（负超额收益的均方根），没有下行时为 0"""
+    returns = np.asarray(returns, dtype=np.float64)
+    excess = returns - risk_free_rate / periods
+    downside = np.sqrt(_nanmean(np.minimum(excess, 0.0) ** 2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = np.sqrt(periods) * _nanmean(excess) / downside
+    return _scalar(np.where(downside == 0, 0.0, ratio))
+
+def calmar_ratio(values, periods=PERIODS_PER_YEAR):
+    """卡玛比率：年化收益率除以最大回撤，没有回撤时为 0"""
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[-1] - 1
+    drawdown = max_drawdown(values)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        annual = (values[..., -1] / values[..., 0]) ** (periods / max(n, 1)) - 1
+        ratio = annual / drawdown
+    return _scalar(np.where(drawdown == 0, 0.0, ratio))
+
+def rolling_ratios(values, window, risk_free_rate=RISK_FREE_RATE, periods=PERIODS_PER_YEAR):
+    """
+    滚动窗口（window 期收益）的夏普、索提诺和卡玛比率
+
+    返回:
+        dict: sharpe, sortino, calmar，与 values 形状相同，前 window 个位置为 NaN
+    """
+    values = np.asarray(values, dtype=np.float64)
+    shape = values.shape
+    result = {name: np.full(shape, np.nan) for name in ('sharpe', 'sortino', 'calmar')}
+    if shape[-1] <= window:
+        return result
+
+    windows = sliding_window_view(values, window + 1, axis=-1)
+    returns = simple_returns(windows)[..., 1:]
+    result['sharpe'][..., window:] = sharpe_ratio(returns, risk_free_rate, periods)
+    result['sortino'][..., window:] = sortino_ratio(returns, risk_free_rate, periods)
+    result['calmar'][..., window:] = calmar_ratio(windows, periods)
+    return result
+
+def performance_metrics(trades, values, initial_capital, risk_free_rate=RISK_FREE_RATE, periods=PERIODS_PER_YEAR):
+    """
+    回测性能指标，字段和数值与 Backtester 原来逐笔配对计算的结果一致，另外增加索提诺和卡玛比率
+
+    参数:
+        trades (DataFrame): 按时间顺序的交易记录，包含 symbol, action, price, date
+        values (array): 每个日期的组合总价值（第一项为初始资金）
+
+    返回:
+        dict: 没有配对完成的交易时为空
+    """
+    if len(trades) == 0:
+        return {}
+    pairs = pair_trades(trades['symbol'].to_numpy(), trades['action'].to_numpy(),
+                        trades['price'].to_numpy(), trades['date'])
+    if len(pairs['profit']) == 0:
+        return {}
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return _summarize(pairs, np.asarray(values, dtype=np.float64), initial_capital, risk_free_rate, periods)
+
+def _summarize(pairs, values, initial_capital, risk_free_rate, periods):
+    """由配对结果和组合价值计算各项指标"""
+    profit = pairs['profit']
+    total_trades = len(profit)
+    wins = profit[pairs['sell_price'] > pairs['buy_price']]
+    gains = profit[profit > 0]
+    losses = profit[profit < 0]
+    winning_trades = len(wins)
+    losing_trades = total_trades - winning_trades
+    returns = simple_returns(values)
+
+    return {
+        'total_trades': total_trades,
+        'winning_trades': winning_trades,
+        'losing_trades': losing_trades,
+        'win_rate': winning_trades / total_trades,
+        'average_win': gains.sum() / len(gains) if winning_trades > 0 else 0,
+        'average_loss': losses.sum() / len(losses) if losing_trades > 0 else 0,
+        'profit_factor': abs(gains.sum() / losses.sum()) if losing_trades > 0 else float('inf'),
+        'average_holding_days': pairs['holding_days'].sum(dtype=np.float64) / total_trades,
+        'max_drawdown': max_drawdown(values),
+        'sharpe_ratio': sharpe_ratio(returns, risk_free_rate, periods),
+        'sortino_ratio': sortino_ratio(returns, risk_free_rate, periods),
+        'calmar_ratio': calmar_ratio(values, periods),
+        'total_return': (values[-1] - initial_capital) / initial_capital
+    }
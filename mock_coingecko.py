@@ -0,0 +1,140 @@
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# 本地模拟的 CoinGecko API，用于离线测试和压测抓取速度
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+class MockState:
+    """模拟服务器的配置和请求计数"""
+
+    def __init__(self, num_coins=300, latency=0.0, rate_per_minute=0):
+        self.num_coins = num_coins
+        self.latency = latency
+        self.rate_per_minute = rate_per_minute
+        self.requests = deque()
+        self.total_requests = 0
+        self.rejected_requests = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """按滑动窗口检查是否超出每分钟请求限制"""
+        with self.lock:
+            self.total_requests += 1
+            if not self.rate_per_minute:
+                return True
+            now = time.monotonic()
+            while self.requests and now - self.requests[0] > 60:
+                self.requests.popleft()
+            if len(self.requests) >= self.rate_per_minute:
+                self.rejected_requests += 1
+                return False
+            self.requests.append(now)
+            return True
+
+def coin_info(rank):
+    """生成第 rank 个币种的基本信息"""
+    return {
+        'id': f"coin-{rank}",
+        'symbol': f"c{rank}",
+        'name': f"Coin {rank}",
+        'market_cap_rank': rank
+    }
+
+def market_chart(coin_id, days):
+    """生成确定性的每日价格、市值和成交量数据，最后一个点为当前时间"""
+    now_ms = int(time.time() * 1000)
+    today_ms = now_ms - now_ms % DAY_MS
+    first_ms = today_ms - 400 * DAY_MS
+
+    rng = random.Random(zlib.crc32(coin_id.encode()))
+    price = rng.uniform(0.01, 100)
+    supply = rng.uniform(1e6, 1e10)
+    series = []
+    ts = first_ms
+    while ts <= today_ms:
+        price *= 1 + rng.gauss(0, 0.03)
+        series.append((ts, price, price * supply, price * supply * rng.uniform(0.01, 0.2)))
+        ts += DAY_MS
+    # 与真实接口一致：最后一个点是当天的实时数据
+    series.append((now_ms, price, price * supply, series[-1][3]))
+
+    series = series[-(days + 1):]
+    return {
+        'prices': [[t, p] for t, p, _, _ in series],
+        'market_caps': [[t, c] for t, _, c, _ in series],
+        'total_volumes': [[t, v] for t, _, _, v in series]
+    }
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if not self.state.allow():
+            self.send_json(429, {'error': 'rate limited'}, {'Retry-After': '5'})
+            return
+
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        parts = [p for p in url.path.split('/') if p]
+
+        if parts[-2:] == ['coins', 'markets']:
+            per_page = int(params.get('per_page', ['100'])[0])
+            page = int(params.get('page', ['1'])[0])
+            start = (page - 1) * 50 + 1
+            ranks = range(start, min(start + per_page, self.state.num_coins + 1))
+            self.send_json(200, [coin_info(rank) for rank in ranks])
+        elif len(parts) >= 3 and parts[-1] == 'market_chart' and parts[-3] == 'coins':
+            days = int(params.get('days', ['360'])[0])
+            self.send_json(200, market_chart(parts[-2], days))
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the CoinGecko API')
+    parser.add_argument('--port', type=int, default=8099, help='Port to listen on')
+    parser.add_argument('--coins', type=int, default=300, help='Number of coins to serve')
+    parser.add_argument('--latency', type=float, default=0.0, help='Artificial latency per request in seconds')
+    parser.add_argument('--rpm', type=int, default=0, help='Reject requests above this rate with 429 (0 = unlimited)')
+    args = parser.parse_args()
+
+    MockHandler.state = MockState(args.coins, args.latency, args.rpm)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), MockHandler)
+    logger.info(f"Mock CoinGecko API running on http://127.0.0.1:{args.port} "
+                f"(set COINGECKO_API_BASE_URL to use it)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        state = MockHandler.state
+        logger.info(f"Served {state.total_requests} requests, rejected {state.rejected_requests}")
+
+if __name__ == '__main__':
+    main()
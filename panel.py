@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from storage import STORE_DIR, open_store
+
+logger = logging.getLogger(__name__)
+
+PANEL_DIR = os.getenv("COIN_PANEL_DIR", "data/panel")
+FIELDS = ("price", "volume", "market_cap")
+DAY_MS = 24 * 60 * 60 * 1000
+
+class Panel:
+    """
+    内存映射的稠密数据面板
+
+    - values: (币种, 天, 字段) 的 float 数组，缺失的日期为 NaN
+    - timestamps: (币种, 天) 的 int64 数组，记录每个数据点的原始时间戳（毫秒），缺失为 -1
+    - 日历按日线收盘时间对齐：UTC 0 点的数据属于当天，盘中实时数据点属于下一个 0 点
+
+    通过 np.load(mmap_mode='r') 打开，多个进程读取时共享操作系统的页缓存。
+    """
+
+    def __init__(self, values, timestamps, index):
+        self.values = values
+        self.timestamps = timestamps
+        self.index = index
+        self.coin_ids = index["coin_ids"]
+        self.symbols = index["symbols"]
+        self.names = index["names"]
+        self.fields = tuple(index["fields"])
+        self.generation = index["generation"]
+        self.first_day = index["first_day"]
+        self._positions = {coin_id: i for i, coin_id in enumerate(self.coin_ids)}
+
+    @property
+    def dates(self):
+        """面板的日历（UTC 0 点）"""
+        days = np.arange(self.first_day, self.first_day + self.values.shape[1], dtype="int64")
+        return pd.to_datetime(days * DAY_MS, unit="ms", utc=True)
+
+    def coin_position(self, coin_id):
+        return self._positions[coin_id]
+
+    def field(self, name):
+        """某个字段的 (币种, 天) 视图，不复制数据"""
+        return self.values[:, :, self.fields.index(name)]
+
+    def frame(self, coin_id):
+        """
+        返回单个币种的数据框，索引为原始时间戳转换的北京时间，与列式存储读取的结果一致
+
+        数据连续时直接引用内存映射的切片，不复制数据。
+        """
+        i = self._positions[coin_id]
+        ts = self.timestamps[i]
+        valid = np.flatnonzero(ts >= 0)
+        if len(valid) == 0:
+            return None
+        start, end = valid[0], valid[-1] + 1
+        if end - start == len(valid):
+            block, ts = self.values[i, start:end], ts[start:end]
+        else:
+            block, ts = self.values[i, valid], ts[valid]
+
+        index = pd.DatetimeIndex(
+            pd.to_datetime(ts, unit="ms", utc=True).tz_convert("Asia/Shanghai"), name="date"
+        )
+        return pd.DataFrame(block, index=index, columns=list(self.fields), copy=False)
+
+def build_panel(store, dtype=np.float64):
+    """
+    从列式存储构建面板
+
+    返回:
+        tuple: (values, timestamps, index)
+    """
+    coins = store.read_coins()
+    table = store.read()
+
+    codes = pd.Categorical(table["coin_id"].to_numpy(), categories=coins["id"]).codes
+    ts = table["timestamp"].cast("int64").to_numpy()
+    # 按日线收盘时间向上取整，UTC 0 点的数据保持不变，盘中数据归到下一个收盘
+    days = -(-ts // DAY_MS)
+    first_day = int(days.min()) if len(days) else 0
+    n_days = int(days.max()) - first_day + 1 if len(days) else 0
+    cols = days - first_day
+
+    values = np.full((len(coins), n_days, len(FIELDS)), np.nan, dtype=dtype)
+    timestamps = np.full((len(coins), n_days), -1, dtype=np.int64)
+    keep = codes >= 0
+    for k, field in enumerate(FIELDS):
+        values[codes[keep], cols[keep], k] = table[field].to_numpy(zero_copy_only=False)[keep]
+    timestamps[codes[keep], cols[keep]] = ts[keep]
+
+    index = {
+        "coin_ids": coins["id"].tolist(),
+        "symbols": coins["symbol"].tolist(),
+        "names": coins["name"].tolist(),
+        "fields": list(FIELDS),
+        "first_day": first_day,
+        "dtype": np.dtype(dtype).name
+    }
+    return values, timestamps, index
+
+def publish_panel(values, timestamps, index, panel_dir=PANEL_DIR, keep=2):
+    """
+    发布新一代面板文件
+
+    先写入带版本号的数据文件，再原子替换 index.json；正在读取旧版本的进程不受影响。
+    只保留最近 keep 代的数据文件。
+    """
+    os.makedirs(panel_dir, exist_ok=True)
+    generation = time.time_ns()
+    values_file = f"values-{generation}.npy"
+    timestamps_file = f"timestamps-{generation}.npy"
+    np.save(os.path.join(panel_dir, values_file), values)
+    np.save(os.path.join(panel_dir, timestamps_file), timestamps)
+
+    index = dict(index, generation=generation, values_file=values_file, timestamps_file=timestamps_file)
+    index_file = os.path.join(panel_dir, "index.json")
+    with open(f"{index_file}.tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(f"{index_file}.tmp", index_file)
+
+    generations = sorted({
+        int(name.split("-")[1].split(".")[0])
+        for name in os.listdir(panel_dir) if name.startswith("values-")
+    })
+    for old in generations[:-keep]:
+        for prefix in ("values", "timestamps"):
+            try:
+                os.remove(os.path.join(panel_dir, f"{prefix}-{old}.npy"))
+            except OSError:
+                pass
+
+    logger.info(f"Published panel generation {generation} "
+                f"({values.shape[0]} coins x {values.shape[1]} days)")
+    return generation
+
+def publish_from_store(store, panel_dir=PANEL_DIR, dtype=np.float64):
+    """从列式存储构建并发布面板"""
+    values, timestamps, index = build_panel(store, dtype)
+    return publish_panel(values, timestamps, index, panel_dir)
+
+def load_panel(panel_dir=PANEL_DIR, index=None):
+    """
+    以内存映射方式打开面板
+
+    参数:
+        index (dict): 指定要打开的版本（Panel.index），默认打开最新发布的版本
+    """
+    if index is None:
+        with open(os.path.join(panel_dir, "index.json")) as f:
+            index = json.load(f)
+    values = np.load(os.path.join(panel_dir, index["values_file"]), mmap_mode="r")
+    timestamps = np.load(os.path.join(panel_dir, index["timestamps_file"]), mmap_mode="r")
+    return Panel(values, timestamps, index)
+
+def open_panel(panel_dir=PANEL_DIR, store_dir=STORE_DIR):
+    """打开面板，如果还没有发布或者比列式存储旧，则先从列式存储重新构建"""
+    index_file = os.path.join(panel_dir, "index.json")
+    store = None
+    try:
+        store = open_store(store_dir)
+        stale = (not os.path.exists(index_file)
+                 or os.path.getmtime(index_file) < os.path.getmtime(store.history_file))
+    except FileNotFoundError:
+        stale = False
+    if stale:
+        publish_from_store(store, panel_dir)
+    return load_panel(panel_dir)
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Publish the memory-mapped coin panel')
+    parser.add_argument('--float32', action='store_true', help='Store values as float32')
+    args = parser.parse_args()
+
+    publish_from_store(open_store(), dtype=np.float32 if args.float32 else np.float64)
+
+if __name__ == '__main__':
+    main()
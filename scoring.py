@@ -0,0 +1,428 @@
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 各分项评分的权重，与 DataProcessor.calculate_indicators 一致
+DEFAULT_WEIGHTS = {
+    'consolidation_score': 1.5,
+    'volume_stability_score': 1.0,
+    'breakout_score': 1.5,
+    'breakout_volume_score': 1.0,
+    'rsi_score': 1.0,
+    'ma_score': 1.0,
+    'cap_score': 1.0
+}
+
+# 输出列，顺序与 coin_scores.csv 一致
+SCORE_COLUMNS = [
+    'consolidation_score', 'volume_stability_score', 'breakout_score', 'breakout_volume_score',
+    'rsi_score', 'ma_score', 'cap_score', 'consolidation_volatility', 'consolidation_range',
+    'volume_stability', 'breakout_price_change', 'breakout_volume_change', 'rsi_current',
+    'rsi_trend', 'ma_trend', 'market_cap', 'data_days', 'total_score'
+]
+INT_COLUMNS = {
+    'consolidation_score', 'volume_stability_score', 'breakout_score', 'breakout_volume_score',
+    'rsi_score', 'ma_score', 'cap_score', 'volume_stability', 'breakout_volume_change', 'data_days'
+}
+
+# 评分引擎计算的原始特征，保存在特征表中用于以不同的权重和阈值重新评分
+FEATURE_COLUMNS = [
+    'consolidation_volatility', 'consolidation_range', 'volume_stability_raw', 'breakout_price_change',
+    'breakout_volume_change_raw', 'rsi_current', 'rsi_trend', 'ma_trend', 'ma_cross', 'market_cap',
+    'log_market_cap', 'data_days'
+]
+
+# 分项评分 = max(0, min(max_score, int(offset + slope * 特征)))，特征不是有限值时为 0；
+# 设置了 gate 的分项只在 gate 特征为真时计分。默认值与 calculate_indicators 中的公式一致
+DEFAULT_RULES = {
+    'consolidation_score': {'feature': 'consolidation_range', 'offset': 10, 'slope': -100},
+    'volume_stability_score': {'feature': 'volume_stability_raw', 'offset': 10, 'slope': -10},
+    'breakout_score': {'feature': 'breakout_price_change', 'offset': 0, 'slope': 1},
+    'breakout_volume_score': {'feature': 'breakout_volume_change_raw', 'offset': 0, 'slope': 1},
+    'rsi_score': {'feature': 'rsi_trend', 'offset': 0, 'slope': 0.5},
+    'ma_score': {'feature': 'ma_trend', 'offset': 5, 'slope': 1, 'gate': 'ma_cross'},
+    'cap_score': {'feature': 'log_market_cap', 'offset': 15, 'slope': -1}
+}
+MAX_SCORE = 10
+
+MIN_DAYS = 30
+RSI_WINDOW = 14
+
+def compact(price, volume, market_cap):
+    """
+    去掉每个币种的无效行（任一字段为 NaN 或无穷大），把有效数据右对齐
+
+    与 calculate_indicators 中的 dropna 等价：第 i 个币种的有效数据位于最后 n[i] 列，前面填充 NaN。
+
+    返回:
+        tuple: (price, volume, market_cap, n)，数组形状相同
+    """
+    price = np.asarray(price, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    market_cap = np.asarray(market_cap, dtype=np.float64)
+    valid = np.isfinite(price) & np.isfinite(volume) & np.isfinite(market_cap)
+    n = valid.sum(axis=1)
+    width = int(n.max()) if len(n) else 0
+
+    # 稳定排序把无效行排到前面，有效行保持原有顺序
+    order = np.argsort(valid, axis=1, kind='stable')[:, valid.shape[1] - width:]
+    padding = np.arange(width) < (width - n)[:, None]
+    arrays = []
+    for values in (price, volume, market_cap):
+        values = np.take_along_axis(values, order, axis=1)
+        values[padding] = np.nan
+        arrays.append(values)
+    return (*arrays, n)
+
+def rolling_mean(values, window):
+    """
+    逐行计算滚动均值，结果与 pandas Series.rolling(window).mean() 逐位一致
+
+    按天推进，每一步对所有行同时做 pandas 的在线 Kahan 求和（加入和移除分别补偿），
+    并保留 pandas 对连续相同值和全正/全负窗口的修正。NaN 不计入窗口的有效数量。
+
+    参数:
+        values: (行, 天) 数组
+        window (int): 窗口大小
+    """
+    values = np.asarray(values, dtype=np.float64)
+    # 按天连续存放，每一步取一整行
+    columns = np.ascontiguousarray(np.where(np.isinf(values), np.nan, values).T)
+    days, rows = columns.shape
+
+    out = np.full((days, rows), np.nan)
+    nobs = np.zeros(rows, dtype=np.int64)
+    neg_ct = np.zeros(rows, dtype=np.int64)
+    sum_x = np.zeros(rows)
+    compensation_add = np.zeros(rows)
+    compensation_remove = np.zeros(rows)
+    same_count = np.zeros(rows, dtype=np.int64)
+    prev_value = columns[0].copy() if days else np.zeros(rows)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i in range(days):
+            # 移出窗口的值
+            if i >= window:
+                val = columns[i - window]
+                ok = val == val
+                y = -val - compensation_remove
+                t = sum_x + y
+                if ok.all():
+                    compensation_remove = t - sum_x - y
+                    sum_x = t
+                else:
+                    compensation_remove = np.where(ok, t - sum_x - y, compensation_remove)
+                    sum_x = np.where(ok, t, sum_x)
+                nobs -= ok
+                neg_ct -= ok & np.signbit(val)
+
+            # 加入窗口的值
+            val = columns[i]
+            ok = val == val
+            y = val - compensation_add
+            t = sum_x + y
+            if ok.all():
+                # 没有 NaN 时（补齐部分之后的绝大多数天）省去按位选择
+                compensation_add = t - sum_x - y
+                sum_x = t
+                same_count = np.where(val == prev_value, same_count + 1, 1)
+                prev_value = val
+            else:
+                compensation_add = np.where(ok, t - sum_x - y, compensation_add)
+                sum_x = np.where(ok, t, sum_x)
+                same_count = np.where(ok, np.where(val == prev_value, same_count + 1, 1), same_count)
+                prev_value = np.where(ok, val, prev_value)
+            nobs += ok
+            neg_ct += ok & np.signbit(val)
+
+            if i + 1 < window:
+                continue
+            result = sum_x / nobs
+            result[(neg_ct == 0) & (result < 0)] = 0.0
+            result[(neg_ct == nobs) & (result > 0)] = 0.0
+            result = np.where(same_count >= nobs, prev_value, result)
+            out[i] = np.where(nobs >= window, result, np.nan)
+    return out.T
+
+def _nanmean(values):
+    """按行求均值，与 pandas 的 Series.mean() 一致（NaN 填 0 后求和）"""
+    mask = np.isnan(values)
+    count = (~mask).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(mask, 0.0, values).sum(axis=1) / count
+
+def _nanstd(values):
+    """按行求样本标准差（ddof=1），与 pandas 的 Series.std() 一致的两遍算法"""
+    mask = np.isnan(values)
+    count = (~mask).sum(axis=1)
+    filled = np.where(mask, 0.0, values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg = filled.sum(axis=1) / count
+        sqr = (avg[:, None] - filled) ** 2
+        sqr[mask] = 0.0
+        var = sqr.sum(axis=1) / (count - 1)
+        var = np.where(count - 1 <= 0, np.nan, var)
+        return np.sqrt(var)
+
+def _clamp(values, max_score=MAX_SCORE):
+    """对应 max(0, min(max_score, int(x)))：向零取整后截断，非有限值为 0"""
+    return np.clip(np.trunc(np.where(np.isfinite(values), values, 0)), 0, max_score).astype(np.int64)
+
+def apply_rules(features, rules=None, max_score=MAX_SCORE):
+    """
+    按规则把原始特征换算成各分项评分
+
+    参数:
+        features: {特征名: 数组} 或数据框
+        rules (dict): 分项评分规则，默认 DEFAULT_RULES
+
+    返回:
+        dict: {分项评分名: int64 数组}
+    """
+    rules = DEFAULT_RULES if rules is None else rules
+    scores = {}
+    with np.errstate(invalid='ignore', over='ignore'):
+        for name, rule in rules.items():
+            raw = rule['offset'] + rule['slope'] * np.asarray(features[rule['feature']], dtype=np.float64)
+            score = _clamp(raw, max_score)
+            if rule.get('gate'):
+                score = np.where(np.asarray(features[rule['gate']], dtype=bool), score, 0)
+            scores[name] = score
+    return scores
+
+def score_arrays(price, volume, market_cap, weights=None):
+    """
+    对 (币种, 天) 数组中的所有币种同时评分
+
+    每个分项的计算方式与 DataProcessor.calculate_indicators 完全相同，结果逐位一致。
+    calculate_indicators 返回 None（有效数据少于 30 天）或在 int() 处抛出异常
+    （例如价格为 0 导致突破幅度为无穷大）的币种在 valid 中标记为 False。
+
+    参数:
+        price, volume, market_cap: (币种, 天) 数组，缺失为 NaN
+        weights (dict): 分项权重，默认 DEFAULT_WEIGHTS
+
+    返回:
+        tuple: (scores, valid)，scores 为 {列名: 数组}，列与 SCORE_COLUMNS 一致
+    """
+    price, volume, market_cap, n = compact(price, volume, market_cap)
+    coins, width = price.shape
+    if coins == 0 or width == 0:
+        return {column: np.full(coins, np.nan) for column in SCORE_COLUMNS}, np.zeros(coins, dtype=bool)
+
+    # RSI、MA20、MA60 的滚动均值
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = np.diff(price, axis=1, prepend=np.nan)
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = -np.where(delta < 0, delta, 0.0)
+    padding = np.isnan(price)
+    gain[padding] = np.nan
+    loss[padding] = np.nan
+    avg_gain, avg_loss = np.split(rolling_mean(np.concatenate([gain, loss]), RSI_WINDOW), 2)
+    ma20 = rolling_mean(price, 20)
+    ma60 = rolling_mean(price, 60)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rs = avg_gain / avg_loss
+        rsi = 100 - (100 / (1 + rs))
+
+    return score_windows(price, volume, market_cap[:, -1], n, rsi, ma20[:, -1], ma60[:, -1], weights)
+
+def score_windows(price, volume, market_cap, n, rsi, ma20, ma60, weights=None):
+    """
+    根据右对齐的最近数据和已经算好的滚动指标评分
+
+    只用到每个币种最近 91 天的价格、90 天的成交量和 14 天的 RSI，
+    因此既可以用完整的历史调用，也可以用增量维护的指标状态调用。
+
+    参数:
+        price, volume, rsi: (币种, 天) 右对齐数组，前面不足的部分为 NaN
+        market_cap, ma20, ma60: 每个币种最新的市值和均线
+        n: 每个币种的有效天数
+
+    返回:
+        tuple: (scores, valid)
+    """
+    weights = DEFAULT_WEIGHTS if weights is None else weights
+    coins, width = price.shape
+    scores = {column: np.full(coins, np.nan) for column in SCORE_COLUMNS}
+    valid = n >= MIN_DAYS
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = price[:, 1:] / price[:, :-1] - 1
+    returns = np.concatenate([np.full((coins, 1), np.nan), returns], axis=1)
+
+    consolidation_windows = np.minimum(90, n // 2)
+    recent_windows = np.minimum(RSI_WINDOW, n // 2)
+
+    # 窗口大小只取决于有效天数，按窗口分组后每组用统一的切片
+    groups = {}
+    for i in np.flatnonzero(valid):
+        groups.setdefault((int(consolidation_windows[i]), int(recent_windows[i])), []).append(i)
+
+    features = {column: np.full(coins, np.nan) for column in FEATURE_COLUMNS}
+    for (cw, rw), rows in groups.items():
+        rows = np.asarray(rows)
+        cons = slice(width - cw, width - rw)
+        recent = slice(width - rw, width)
+        cons_price = price[rows, cons]
+        cons_volume = volume[rows, cons]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cons_mean = _nanmean(cons_price)
+            avg_volume = _nanmean(cons_volume)
+            features['consolidation_volatility'][rows] = _nanstd(returns[rows, cons])
+            features['consolidation_range'][rows] = (cons_price.max(axis=1) - cons_price.min(axis=1)) / cons_mean
+            # 平均成交量为 0 时两者都不是有限值，对应的分项评分为 0
+            features['volume_stability_raw'][rows] = _nanstd(cons_volume) / avg_volume
+            features['breakout_price_change'][rows] = (price[rows, -1] / cons_mean - 1) * 100
+            features['breakout_volume_change_raw'][rows] = (_nanmean(volume[rows, recent]) / avg_volume - 1) * 100
+
+            recent_rsi = rsi[rows, recent]
+            all_nan = np.isnan(recent_rsi).all(axis=1)
+            rsi_low = np.where(all_nan, np.nan, np.nanmin(np.where(all_nan[:, None], 0, recent_rsi), axis=1))
+            features['rsi_current'][rows] = recent_rsi[:, -1]
+            features['rsi_trend'][rows] = recent_rsi[:, -1] - rsi_low
+
+    price_current = price[:, -1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        features['ma_cross'] = (price_current > ma20) & (price_current > ma60)
+        features['ma_trend'] = (ma20 / ma60 - 1) * 100
+        features['log_market_cap'] = np.log10(np.where(market_cap > 0, market_cap, np.nan))
+    features['market_cap'] = market_cap
+    features['data_days'] = n.astype(np.int64)
+
+    # calculate_indicators 在这些 int() 处会抛出异常
+    with np.errstate(invalid='ignore', over='ignore'):
+        valid &= np.isfinite(10 - features['consolidation_range'] * 100)
+        valid &= np.isfinite(features['breakout_price_change']) & np.isfinite(features['rsi_trend'] * 0.5)
+        valid &= np.isfinite(5 + features['ma_trend']) | ~features['ma_cross']
+
+    scores.update(features)
+    scores.update(apply_rules(features))
+    # 与 calculate_indicators 一致，这两列记录的是分项评分
+    scores['volume_stability'] = scores['volume_stability_score'].copy()
+    scores['breakout_volume_change'] = scores['breakout_volume_score'].copy()
+    scores['total_score'] = weighted_total(scores, weights)
+    return scores, valid
+
+def weighted_total(scores, weights=None):
+    """分项评分的加权平均"""
+    weights = DEFAULT_WEIGHTS if weights is None else weights
+    total = 0
+    for key, weight in weights.items():
+        total = total + scores[key] * weight
+    return total / sum(weights.values())
+
+def panel_coins(panel):
+    """面板中所有币种的记录（id, symbol, name, rank），按排名排序"""
+    return [
+        {'id': coin_id, 'symbol': symbol, 'name': name, 'rank': rank}
+        for rank, (coin_id, symbol, name) in enumerate(zip(panel.coin_ids, panel.symbols, panel.names), 1)
+    ]
+
+def score_panel(panel, coins=None, weights=None, with_features=False):
+    """
+    对面板中的币种评分，返回与 coin_scores.csv 格式相同的数据框
+
+    参数:
+        panel (Panel): 数据面板
+        coins (list): 要评分的币种记录（id, symbol, name, rank），默认面板中的所有币种
+        with_features (bool): 同时返回原始特征表，返回 (评分, 特征)
+    """
+    coins = panel_coins(panel) if coins is None else coins
+    positions = [panel.coin_position(coin['id']) for coin in coins]
+    scores, valid = score_arrays(
+        panel.field('price')[positions], panel.field('volume')[positions],
+        panel.field('market_cap')[positions], weights
+    )
+    if with_features:
+        return scores_frame(coins, scores, valid), features_frame(coins, scores, valid)
+    return scores_frame(coins, scores, valid)
+
+def scores_frame(coins, scores, valid):
+    """把评分结果整理成与 coin_scores.csv 格式相同的数据框，跳过无效的币种"""
+    for coin in np.asarray(coins, dtype=object)[~valid]:
+        logger.warning(f"Skipping {coin['name']} due to insufficient data")
+
+    df = pd.DataFrame(coins, columns=['id', 'symbol', 'name', 'rank'])
+    for column in SCORE_COLUMNS:
+        df[column] = scores[column]
+    df = df[valid].reset_index(drop=True)
+    for column in INT_COLUMNS:
+        df[column] = df[column].astype(np.int64)
+    return df
+
+def features_frame(coins, scores, valid):
+    """有效币种的原始特征表，列为 id, symbol, name, rank 和 FEATURE_COLUMNS"""
+    df = pd.DataFrame(coins, columns=['id', 'symbol', 'name', 'rank'])
+    for column in FEATURE_COLUMNS:
+        df[column] = scores[column]
+    df = df[valid].reset_index(drop=True)
+    df['ma_cross'] = df['ma_cross'].astype(bool)
+    df['data_days'] = df['data_days'].astype(np.int64)
+    return df
+
+def verify(panel, coins=None):
+    """
+    逐个币种对比 calculate_indicators 和批量评分的结果
+
+    返回:
+        int: 不一致的币种数量
+    """
+    from data_processor import DataProcessor
+
+    expected = {}
+    started = time.perf_counter()
+    for coin_id in (panel.coin_ids if coins is None else [c['id'] for c in coins]):
+        frame = panel.frame(coin_id)
+        try:
+            result = DataProcessor.calculate_indicators(frame) if frame is not None else None
+        except (ValueError, OverflowError):
+            result = None
+        if result is not None:
+            expected[coin_id] = result
+    per_coin = time.perf_counter() - started
+
+    started = time.perf_counter()
+    df = score_panel(panel, coins)
+    batched = time.perf_counter() - started
+
+    mismatches = 0
+    actual = {record['id']: record for record in df.to_dict('records')}
+    if set(actual) != set(expected):
+        logger.error(f"Scored coins differ: {sorted(set(actual) ^ set(expected))}")
+        mismatches += len(set(actual) ^ set(expected))
+    for coin_id in set(actual) & set(expected):
+        for column in SCORE_COLUMNS:
+            a, b = actual[coin_id][column], expected[coin_id][column]
+            if not (a == b or (pd.isna(a) and pd.isna(b))):
+                logger.error(f"{coin_id} {column}: batched {a!r} != per-coin {b!r}")
+                mismatches += 1
+                break
+
+    logger.info(f"Verified {len(expected)} coins: {mismatches} mismatches, "
+                f"per-coin {per_coin:.3f}s, batched {batched:.3f}s")
+    return mismatches
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Score every coin in the panel at once')
+    parser.add_argument('--verify', action='store_true', help='Compare against DataProcessor.calculate_indicators')
+    parser.add_argument('--output', default='coin_scores.csv', help='Where to write the scores')
+    args = parser.parse_args()
+
+    from panel import open_panel
+    panel = open_panel()
+    if args.verify:
+        raise SystemExit(1 if verify(panel) else 0)
+
+    started = time.perf_counter()
+    df = score_panel(panel)
+    df.to_csv(args.output, index=False)
+    logger.info(f"Scored {len(df)} coins in {time.perf_counter() - started:.3f}s, saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import os
+import sys
+import signal
+import socket
+import logging
+import argparse
+from werkzeug.serving import make_server
+from web import app, broadcaster, init_worker, warm_caches
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+try:
+    import gevent
+except ImportError:
+    gevent = None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(process)d - %(name)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+logger = logging.getLogger(__name__)
+
+# 工作进程数和每个进程的线程数
+WEB_WORKERS = int(os.getenv("COIN_WEB_WORKERS", 4))
+WEB_THREADS = int(os.getenv("COIN_WEB_THREADS", 8))
+
+# gevent 工作进程的并发连接数上限
+WEB_CONNECTIONS = int(os.getenv("COIN_WEB_CONNECTIONS", 1000))
+
+# 默认使用 gevent 工作进程：SSE 连接是协程，不占用处理普通请求的线程
+WORKER_CLASSES = ('gevent', 'gthread')
+DEFAULT_WORKER_CLASS = 'gevent' if gevent is not None else 'gthread'
+
+if BaseApplication is not None:
+    class GunicornApplication(BaseApplication):
+        """在代码中配置的 gunicorn 应用"""
+
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+def post_worker_init(worker):
+    """gunicorn 工作进程初始化（gevent 打补丁）之后重新创建缓存和广播器的锁"""
+    init_worker()
+
+def serve_gunicorn(host, port, workers, threads, worker_class=DEFAULT_WORKER_CLASS, connections=WEB_CONNECTIONS):
+    """
+    用 gunicorn 启动多进程服务
+
+    gevent 工作进程中每个 SSE 连接是一个协程，订阅最多使用九成的 connections；
+    gthread 工作进程中每个 SSE 连接占用一个线程，最多只给订阅使用一半的线程，其余线程留给普通请求。
+    """
+    options = {
+        'bind': f"{host}:{port}",
+        'workers': workers,
+        'worker_class': worker_class,
+        # 快照在主进程中加载后再 fork，工作进程共享同一份内存页
+        'preload_app': True,
+        'post_worker_init': post_worker_init,
+        'accesslog': '-'
+    }
+    if worker_class == 'gevent':
+        options['worker_connections'] = connections
+        # 留出十分之一的连接给普通请求
+        broadcaster.max_subscribers = min(broadcaster.max_subscribers, max(connections * 9 // 10, 1))
+    else:
+        options['threads'] = threads
+        broadcaster.max_subscribers = min(broadcaster.max_subscribers, threads // 2)
+    logger.info(f"Starting gunicorn with {workers} {worker_class} workers, "
+                f"up to {broadcaster.max_subscribers} event subscribers per worker")
+    GunicornApplication(app, options).run()
+
+def serve_prefork(host, port, workers):
+    """
+    没有安装 gunicorn 时的预派生服务：主进程监听端口后 fork 出 workers 个进程，
+    每个进程在同一个套接字上运行多线程的 werkzeug 服务器，退出的工作进程会被重新启动
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        return pid
+
+    children = {spawn() for _ in range(workers)}
+    logger.info(f"Serving on http://{host}:{port} with {workers} worker processes")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {status}, restarting")
+            children.add(spawn())
+    sock.close()
+    logger.info("Server stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the web app with multiple worker processes')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to bind')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8000)), help='Port to bind')
+    parser.add_argument('--workers', type=int, default=WEB_WORKERS, help='Number of worker processes')
+    parser.add_argument('--threads', type=int, default=WEB_THREADS,
+                        help='Threads per gthread worker (werkzeug workers use one thread per request)')
+    parser.add_argument('--worker-class', choices=WORKER_CLASSES, default=DEFAULT_WORKER_CLASS,
+                        help='gunicorn worker class (gevent keeps event streams off the request threads)')
+    parser.add_argument('--connections', type=int, default=WEB_CONNECTIONS,
+                        help='Concurrent connections per gevent worker')
+    args = parser.parse_args()
+    if args.worker_class == 'gevent' and gevent is None:
+        parser.error('gevent is not installed, use --worker-class gthread')
+
+    # 在 fork 之前加载评分和信号快照
+    warm_caches()
+
+    if BaseApplication is not None:
+        serve_gunicorn(args.host, args.port, args.workers, args.threads, args.worker_class, args.connections)
+    else:
+        logger.warning("gunicorn is not installed, falling back to pre-forked werkzeug servers")
+        serve_prefork(args.host, args.port, args.workers)
+
+if __name__ == '__main__':
+    main()
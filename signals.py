@@ -0,0 +1,114 @@
+import os
+import json
+import logging
+import argparse
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SIGNALS_FILE = os.getenv("COIN_SIGNALS_FILE", "data/signals.json")
+
+# 交易建议的默认参数，与回测系统一致
+STOP_LOSS = 0.1
+TAKE_PROFIT = 0.2
+TOP_SIGNALS = 5
+
+def compute_signals(coin_data=None, now=None, stop_loss=STOP_LOSS, take_profit=TAKE_PROFIT,
+                    buy_threshold=None, top=TOP_SIGNALS):
+    """
+    计算当前的买入建议：总分最高的 top 个币种中总分超过 buy_threshold 的币种
+
+    与原来每次请求时构造 Backtester 并调用 generate_signals 的结果相同，但不创建回测日志文件。
+
+    回测和评分模块只在这里导入，Web 服务和 Bot 只读取已发布的快照，不加载它们。
+
+    参数:
+        buy_threshold (float): 默认为 features.BUY_THRESHOLD
+
+    返回:
+        dict: created_at, stop_loss, take_profit, buy_threshold 和 signals
+              （每个信号包含 symbol, score, price, stop_loss, take_profit）
+    """
+    from backtest import DataLoader, SignalMatrix
+    from features import BUY_THRESHOLD
+
+    buy_threshold = BUY_THRESHOLD if buy_threshold is None else buy_threshold
+    coin_data = DataLoader().load_data() if coin_data is None else coin_data
+    now = pd.Timestamp.now(tz='UTC') if now is None else now
+    signals = SignalMatrix.build(coin_data, [now]).signals(now)
+
+    # 按信号强度排序
+    ranked = sorted(signals.items(), key=lambda x: x[1]['total_score'], reverse=True)
+
+    buy_signals = []
+    for symbol, signal in ranked[:top]:
+        if signal['total_score'] > buy_threshold:
+            price = float(coin_data[symbol]['data'].iloc[-1]['price'])
+            buy_signals.append({
+                'symbol': symbol,
+                'score': signal['total_score'],
+                'price': price,
+                'stop_loss': price * (1 - stop_loss),
+                'take_profit': price * (1 + take_profit)
+            })
+
+    return {
+        'created_at': now.isoformat(),
+        'stop_loss': stop_loss,
+        'take_profit': take_profit,
+        'buy_threshold': buy_threshold,
+        'signals': buy_signals
+    }
+
+def load_signals(path=SIGNALS_FILE):
+    """读取已发布的交易信号快照"""
+    with open(path) as f:
+        return json.load(f)
+
+def signal_diff(previous, current):
+    """
+    两次发布之间交易信号的变化（按内容比较，价格、止损止盈或评分变化的信号也会发送）
+
+    返回:
+        dict: signals（新出现或内容变化的信号）, withdrawn（不再出现的币种）
+    """
+    before = {signal['symbol']: signal for signal in previous['signals']} if previous else {}
+    after = current['signals'] if current else []
+    symbols = {signal['symbol'] for signal in after}
+    return {
+        'signals': [signal for signal in after if before.get(signal['symbol']) != signal],
+        'withdrawn': sorted(set(before) - symbols)
+    }
+
+def publish_signals(snapshot, path=SIGNALS_FILE):
+    """
+    发布交易信号快照，generation 在上一次发布的基础上加 1
+
+    先写临时文件再原子替换，Web 服务和 Bot 读取时不会看到写了一半的文件。
+    """
+    try:
+        generation = load_signals(path)['generation'] + 1
+    except (OSError, ValueError, KeyError):
+        generation = 1
+    snapshot = dict(snapshot, generation=generation)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(f"{path}.tmp", path)
+    logger.info(f"Published {len(snapshot['signals'])} trading signals as generation {generation} to {path}")
+    return snapshot
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Compute and publish the current trading signals')
+    parser.add_argument('--output', default=SIGNALS_FILE, help='Where to publish the signal snapshot')
+    args = parser.parse_args()
+
+    snapshot = publish_signals(compute_signals(), args.output)
+    print(json.dumps(snapshot, indent=2))
+
+if __name__ == '__main__':
+    main()
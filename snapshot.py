@@ -0,0 +1,305 @@
+import os
+import re
+import gzip
+import json
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime
+from urllib.parse import unquote_plus
+import numpy as np
+import pandas as pd
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SCORES_FILE = os.getenv("COIN_SCORES_FILE", "coin_scores.csv")
+
+# 首页展示的币种数量，与 templates/index.html 中的 coins[:50] 一致
+INDEX_TOP_N = 50
+
+# 首页用到的评分列，非数值按 0 处理
+INDEX_COLUMNS = [
+    'total_score', 'consolidation_score', 'volume_stability_score',
+    'breakout_score', 'rsi_score', 'ma_score'
+]
+
+# 小于这个大小的响应不压缩
+COMPRESS_MIN_BYTES = 1024
+
+# 每个快照缓存的查询响应数量
+RESPONSE_CACHE_SIZE = 256
+
+# /api/coins 的查询：filters 为 (列, 运算符, 值)，sort 为 (列, 是否降序)
+CoinQuery = namedtuple('CoinQuery', ['filters', 'sort', 'limit', 'offset', 'fields'])
+
+QUERY_OPTIONS = {'sort', 'limit', 'offset', 'fields'}
+FILTER_PATTERN = re.compile(r'^(\w+)(>=|<=|!=|>|<|=)(.*)$')
+OPERATORS = {
+    '>=': np.greater_equal, '<=': np.less_equal, '>': np.greater,
+    '<': np.less, '=': np.equal, '!=': np.not_equal
+}
+
+def parse_query(query_string):
+    """
+    解析 /api/coins 的查询字符串，例如：
+        sort=-total_score&limit=20&offset=40&fields=symbol,total_score&total_score>=7&rank<=100&symbol=btc
+    sort 前加 - 表示降序；过滤条件支持 >= <= > < = !=，多个条件同时满足。
+
+    返回:
+        CoinQuery: 规范化的查询，可以作为缓存键
+    """
+    filters, options = [], {}
+    for part in query_string.split('&'):
+        part = unquote_plus(part)
+        if not part:
+            continue
+        key, sep, value = part.partition('=')
+        if sep and key in QUERY_OPTIONS:
+            options[key] = value
+            continue
+        match = FILTER_PATTERN.match(part)
+        if match is None:
+            raise ValueError(f"Invalid query parameter: {part}")
+        filters.append(match.groups())
+
+    sort = None
+    if options.get('sort'):
+        column = options['sort']
+        sort = (column.lstrip('-'), column.startswith('-'))
+    limit = _non_negative(options, 'limit')
+    offset = _non_negative(options, 'offset') or 0
+    fields = tuple(f for f in options['fields'].split(',') if f) if options.get('fields') else None
+    return CoinQuery(tuple(filters), sort, limit, offset, fields)
+
+def _non_negative(options, name):
+    if not options.get(name):
+        return None
+    try:
+        value = int(options[name])
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if value < 0:
+        raise ValueError(f"{name} must not be negative")
+    return value
+
+# 支持的压缩方式，按优先顺序排列（brotli 为可选依赖）
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def compress(body, encoding):
+    """按 encoding（'br'、'gzip' 或 None）压缩响应体"""
+    if encoding == 'br':
+        return brotli.compress(body)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+class ScoreSnapshot:
+    """
+    coin_scores.csv 某一版本的内存快照
+
+    columns: 各列数组（数值列为 float64 / int64），行顺序与文件相同
+    by_total: 按 total_score 降序排列的行号
+    rows: 每一行预先序列化的 JSON 字节
+    payload: /api/coins 的完整 JSON 字节
+    index_coins: 首页展示的前 INDEX_TOP_N 个币种
+    scores: 首页用到的各评分列（float64）
+    """
+
+    def __init__(self, df, key, mtime):
+        self.key = key
+        self.generation = key[0]
+        self.update_time = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
+        self.size = len(df)
+        self.records = df.to_dict('records')
+        self.rows = [json.dumps(record, sort_keys=True, separators=(',', ':')).encode() for record in self.records]
+        self.payload = b'[' + b','.join(self.rows) + b']\n'
+        self.columns = {column: df[column].to_numpy() for column in df.columns}
+        self._responses = {}
+
+        # 首页用到的评分列（非数值按 0 处理）和币种 id，用于生成首页数据和快照之间的差异
+        self.ids = df['id'].astype(str).to_numpy()
+        self.scores = {
+            column: pd.to_numeric(df[column], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+            for column in INDEX_COLUMNS
+        }
+        # 与 DataFrame.sort_values('total_score', ascending=False) 的顺序相同（同分时的先后也一致）
+        self.by_total = pd.Series(self.scores['total_score']).sort_values(ascending=False).index.to_numpy()
+        self.index_coins = self.coins(self.by_total[:INDEX_TOP_N])
+
+    def coins(self, rows):
+        """若干行的首页展示格式"""
+        coins = []
+        for i in rows:
+            coin = {
+                'id': self.ids[i],
+                'rank': str(self.columns['rank'][i]),
+                'symbol': str(self.columns['symbol'][i]).upper(),
+                'name': str(self.columns['name'][i])
+            }
+            for column in INDEX_COLUMNS:
+                coin[column] = float(self.scores[column][i])
+            coins.append(coin)
+        return coins
+
+    def diff(self, previous):
+        """
+        与上一个快照相比首页数据的变化
+
+        首页展示哪些币种以及顺序由服务端决定（by_total 的前 INDEX_TOP_N 个），客户端不需要自己排序。
+
+        返回:
+            dict: index（首页币种的 id，按展示顺序）,
+                  changed（其中新进入首页或数据有变化的币种，首页展示格式）
+        """
+        before = {coin['id']: coin for coin in previous.index_coins} if len(previous) else {}
+        return {
+            'index': [coin['id'] for coin in self.index_coins],
+            'changed': [coin for coin in self.index_coins if before.get(coin['id']) != coin]
+        }
+
+    def __len__(self):
+        return self.size
+
+    def _numeric(self, column):
+        values = self.columns[column]
+        if values.dtype.kind not in 'iuf':
+            return None
+        return values.astype(np.float64, copy=False)
+
+    def top(self, n, column='total_score', descending=True, rows=None):
+        """
+        按某一列取前 n 行，返回行号
+
+        用 np.partition 找到第 n 个值，只对不超过它的行排序，不对全部行排序；
+        同值按行号先后排列（分页结果稳定），缺失值排在最后。
+
+        参数:
+            rows (array): 只在这些行中选择，默认为所有行
+        """
+        rows = np.arange(self.size) if rows is None else rows
+        key = self._numeric(column)
+        if key is None:
+            raise ValueError(f"Cannot sort by non-numeric column: {column}")
+        key = key[rows]
+        key = -key if descending else key
+        key = np.where(np.isnan(key), np.inf, key)
+        n = max(0, min(n, len(rows)))
+        if n == 0:
+            return rows[:0]
+        if n < len(rows):
+            kth = np.partition(key, n - 1)[n - 1]
+            candidates = np.flatnonzero(key <= kth)
+        else:
+            candidates = np.arange(len(rows))
+        return rows[candidates[np.argsort(key[candidates], kind='stable')][:n]]
+
+    def select(self, query):
+        """按查询过滤、排序和分页，返回行号"""
+        for column in [f[0] for f in query.filters] + ([query.sort[0]] if query.sort else []) + list(query.fields or []):
+            if column not in self.columns:
+                raise ValueError(f"Unknown column: {column}")
+
+        mask = np.ones(self.size, dtype=bool)
+        for column, operator, value in query.filters:
+            numeric = self._numeric(column)
+            if numeric is not None:
+                try:
+                    target = float(value)
+                except ValueError:
+                    raise ValueError(f"{column} must be compared with a number")
+                with np.errstate(invalid='ignore'):
+                    mask &= OPERATORS[operator](numeric, target)
+            elif operator in ('=', '!='):
+                matched = np.array([str(v).lower() == value.lower() for v in self.columns[column]], dtype=bool)
+                mask &= matched if operator == '=' else ~matched
+            else:
+                raise ValueError(f"Only = and != are supported for {column}")
+        rows = np.flatnonzero(mask)
+
+        stop = None if query.limit is None else query.offset + query.limit
+        if query.sort:
+            column, descending = query.sort
+            rows = self.top(len(rows) if stop is None else stop, column, descending, rows)
+        return rows[query.offset:stop]
+
+    def body(self, query):
+        """查询结果的 JSON 字节，与完整列表的格式相同"""
+        if query == CoinQuery((), None, None, 0, None):
+            return self.payload
+        rows = self.select(query)
+        if query.fields is None:
+            return b'[' + b','.join(self.rows[i] for i in rows) + b']\n'
+        records = [{field: self.records[i][field] for field in query.fields} for i in rows]
+        return json.dumps(records, sort_keys=True, separators=(',', ':')).encode() + b'\n'
+
+    def response(self, query, encoding=None):
+        """
+        查询结果的响应体（按需压缩），同一快照内相同的查询直接返回缓存
+
+        返回:
+            (bytes, str): 响应体和实际使用的压缩方式（太小的响应不压缩）
+        """
+        key = (query, encoding)
+        cached = self._responses.get(key)
+        if cached is not None:
+            return cached
+        body = self.body(query)
+        if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+            encoding = None
+        cached = (compress(body, encoding), encoding)
+        if len(self._responses) >= RESPONSE_CACHE_SIZE:
+            self._responses.clear()
+        self._responses[key] = cached
+        return cached
+
+    def etag(self, encoding=None):
+        """与评分版本绑定的强 ETag，不同压缩方式的表示使用不同的 ETag"""
+        return f"{self.generation:x}-{encoding}" if encoding else f"{self.generation:x}"
+
+def load_snapshot(path=SCORES_FILE):
+    """读取评分文件生成快照"""
+    stat = os.stat(path)
+    df = pd.read_csv(path)
+    snapshot = ScoreSnapshot(df, (stat.st_mtime_ns, stat.st_size), stat.st_mtime)
+    logger.info(f"Loaded score snapshot of {len(snapshot)} coins from {path}")
+    return snapshot
+
+class FileCache:
+    """
+    进程内的文件缓存
+
+    每次访问只做一次 os.stat，文件的修改时间或大小变化后用 loader 重新加载，多个请求线程共享同一份结果。
+    """
+
+    def __init__(self, path, loader):
+        self.path = path
+        self.loader = loader
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """重新创建锁（fork 之后在工作进程中调用），已加载的内容保留"""
+        self._lock = threading.Lock()
+
+    def get(self):
+        stat = os.stat(self.path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entry
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        with self._lock:
+            if self._entry is None or self._entry[0] != key:
+                # 先记录文件状态再加载，加载期间文件被替换时下一次访问会重新加载
+                self._entry = (key, self.loader(self.path))
+            return self._entry[1]
+
+class SnapshotCache(FileCache):
+    """coin_scores.csv 的快照缓存，分析任务写入新文件后下一次访问自动重新加载"""
+
+    def __init__(self, path=SCORES_FILE):
+        super().__init__(path, load_snapshot)
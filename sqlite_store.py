@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import logging
+from contextlib import contextmanager
+from market_chart import parse_market_chart
+
+logger = logging.getLogger(__name__)
+
+# 设置 COIN_SQLITE_DB 后启用 SQLite 存储，例如 data/coins.db
+SQLITE_PATH = os.getenv("COIN_SQLITE_DB", "")
+DAY_MS = 24 * 60 * 60 * 1000
+
+# scores 表中保存的评分字段，与 coin_scores.csv 的列一致
+SCORE_COLUMNS = [
+    'consolidation_score', 'volume_stability_score', 'breakout_score', 'breakout_volume_score',
+    'rsi_score', 'ma_score', 'cap_score', 'consolidation_volatility', 'consolidation_range',
+    'volume_stability', 'breakout_price_change', 'breakout_volume_change', 'rsi_current',
+    'rsi_trend', 'ma_trend', 'market_cap', 'data_days', 'total_score'
+]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS coins (
+    id TEXT PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    name TEXT NOT NULL,
+    rank INTEGER
+);
+CREATE INDEX IF NOT EXISTS coins_symbol ON coins (symbol);
+CREATE TABLE IF NOT EXISTS prices (
+    coin_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    price REAL,
+    volume REAL,
+    market_cap REAL,
+    PRIMARY KEY (coin_id, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS scores (
+    run_date TEXT NOT NULL,
+    coin_id TEXT NOT NULL,
+    symbol TEXT,
+    name TEXT,
+    rank INTEGER,
+    {', '.join(f'{c} REAL' for c in SCORE_COLUMNS)},
+    PRIMARY KEY (run_date, coin_id)
+) WITHOUT ROWID;
+"""
+
+class SQLiteStore:
+    """
+    SQLite 存储的历史价格和每日评分
+
+    使用 WAL 模式，每日任务写入时 Flask 和 Telegram Bot 仍然可以并发读取。
+    prices 按 (coin_id, ts) 主键存储，scores 按 (run_date, coin_id) 主键存储，写入都是 upsert。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        """每次操作使用独立连接，可以在多个线程中安全使用"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def upsert_coins(self, coins):
+        """写入币种信息，rank 按列表顺序从 1 开始"""
+        with self.connect() as conn:
+            conn.executemany(
+                "INSERT INTO coins (id, symbol, name, rank) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET symbol=excluded.symbol, name=excluded.name, rank=excluded.rank",
+                [(c['id'], c['symbol'], c['name'], rank) for rank, c in enumerate(coins, 1)]
+            )
+
+    def upsert_prices(self, coin_id, payload):
+        """
+        写入一个币种新获取的 market_chart 数据
+
+        与 merge_history 一致，新数据覆盖从其第一个时间戳开始的旧数据（包括旧的盘中实时数据点）。
+        """
+        timestamps, values = parse_market_chart(payload)
+        if len(timestamps) == 0:
+            return 0
+        rows = [(coin_id, ts, *row) for ts, row in zip(timestamps.tolist(), values.tolist())]
+
+        with self.connect() as conn:
+            conn.execute("DELETE FROM prices WHERE coin_id = ? AND ts >= ?", (coin_id, rows[0][1]))
+            conn.executemany(
+                "INSERT INTO prices (coin_id, ts, price, volume, market_cap) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(coin_id, ts) DO UPDATE SET price=excluded.price, "
+                "volume=excluded.volume, market_cap=excluded.market_cap",
+                rows
+            )
+        return len(rows)
+
+    def latest_ts(self, coin_id):
+        """某个币种已保存的最新时间戳，没有数据时返回 None"""
+        with self.connect() as conn:
+            return conn.execute("SELECT MAX(ts) FROM prices WHERE coin_id = ?", (coin_id,)).fetchone()[0]
+
+    def upsert_scores(self, run_date, results):
+        """写入某一天的评分结果"""
+        columns = ['run_date', 'coin_id', 'symbol', 'name', 'rank'] + SCORE_COLUMNS
+        placeholders = ', '.join('?' for _ in columns)
+        updates = ', '.join(f"{c}=excluded.{c}" for c in columns[2:])
+        rows = [
+            (run_date, r['id'], r['symbol'], r['name'], int(r['rank']),
+             *[None if r.get(c) is None else float(r[c]) for c in SCORE_COLUMNS])
+            for r in results
+        ]
+        with self.connect() as conn:
+            conn.executemany(
+                f"INSERT INTO scores ({', '.join(columns)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(run_date, coin_id) DO UPDATE SET {updates}",
+                rows
+            )
+
+    def latest_scores(self):
+        """最近一次分析的评分，格式与 coin_scores.csv 的记录一致"""
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM scores WHERE run_date = (SELECT MAX(run_date) FROM scores) ORDER BY rank"
+            ).fetchall()
+        results = []
+        for row in rows:
+            record = dict(row)
+            record['id'] = record.pop('coin_id')
+            del record['run_date']
+            results.append(record)
+        return results
+
+    def find_coin(self, key):
+        """按 id 或 symbol（不区分大小写）查找币种，symbol 重复时取排名最高的"""
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM coins WHERE id = ? OR symbol = ? ORDER BY rank LIMIT 1",
+                (key, key.lower())
+            ).fetchone()
+        return dict(row) if row else None
+
+    def coin_history(self, coin_id, days=30):
+        """查询单个币种最近 days 天的数据，走 (coin_id, ts) 主键索引"""
+        latest = self.latest_ts(coin_id)
+        if latest is None:
+            return []
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT ts, price, volume, market_cap FROM prices "
+                "WHERE coin_id = ? AND ts > ? ORDER BY ts",
+                (coin_id, latest - days * DAY_MS)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def coin_score(self, coin_id):
+        """某个币种最近一次的评分"""
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM scores WHERE coin_id = ? ORDER BY run_date DESC LIMIT 1", (coin_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+_store = None
+
+def get_sqlite_store():
+    """如果配置了 COIN_SQLITE_DB 则返回共享的 SQLiteStore，否则返回 None"""
+    global _store
+    if not SQLITE_PATH:
+        return None
+    if _store is None:
+        _store = SQLiteStore(SQLITE_PATH)
+    return _store
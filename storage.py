@@ -0,0 +1,185 @@
+import os
+import csv
+import json
+import logging
+import argparse
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from market_chart import parse_market_chart
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = os.getenv("COIN_STORE_DIR", "data/store")
+
+HISTORY_SCHEMA = pa.schema([
+    ("coin_id", pa.string()),
+    ("timestamp", pa.timestamp("ms", tz="UTC")),
+    ("price", pa.float64()),
+    ("volume", pa.float64()),
+    ("market_cap", pa.float64())
+])
+
+COINS_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("symbol", pa.string()),
+    ("name", pa.string()),
+    ("rank", pa.int64())
+])
+
+class HistoryStore:
+    """
+    列式存储的历史数据
+
+    - history.parquet: 长表 (coin_id, timestamp, price, volume, market_cap)，按排名和时间排序，
+      每个 row group 包含若干个币种，读取时支持列裁剪和按币种/日期过滤
+    - coins.parquet: 币种信息 (id, symbol, name, rank)
+    """
+
+    def __init__(self, store_dir=STORE_DIR, coins_per_row_group=50):
+        self.store_dir = store_dir
+        self.history_file = os.path.join(store_dir, "history.parquet")
+        self.coins_file = os.path.join(store_dir, "coins.parquet")
+        self.coins_per_row_group = coins_per_row_group
+
+    def exists(self):
+        return os.path.exists(self.history_file) and os.path.exists(self.coins_file)
+
+    @staticmethod
+    def payload_to_table(coin_id, payload):
+        """把 market_chart 原始数据转换为长表，成交量和市值按价格的时间戳对齐"""
+        timestamps, values = parse_market_chart(payload)
+        return pa.table({
+            "coin_id": pa.array([coin_id] * len(timestamps), pa.string()),
+            "timestamp": pa.array(timestamps, pa.timestamp("ms", tz="UTC")),
+            "price": pa.array(values[:, 0]),
+            "volume": pa.array(values[:, 1]),
+            "market_cap": pa.array(values[:, 2])
+        }, schema=HISTORY_SCHEMA)
+
+    def write(self, coins, load_payload):
+        """
+        按排名顺序写入所有币种，每次只在内存中保留一个 row group 的数据
+
+        参数:
+            coins (list): 按排名排序的币种信息，包含 id, symbol, name
+            load_payload (callable): 根据币种 id 返回 market_chart 原始数据（dict），缺失时返回 None
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_history = f"{self.history_file}.tmp"
+        written = []
+        chunk = []
+
+        with pq.ParquetWriter(tmp_history, HISTORY_SCHEMA, compression="zstd") as writer:
+            for coin in coins:
+                payload = load_payload(coin["id"])
+                if payload is None:
+                    logger.warning(f"Skipping {coin['id']} due to missing historical data.")
+                    continue
+                chunk.append(self.payload_to_table(coin["id"], payload))
+                written.append(coin)
+                if len(chunk) >= self.coins_per_row_group:
+                    writer.write_table(pa.concat_tables(chunk))
+                    chunk = []
+            if chunk:
+                writer.write_table(pa.concat_tables(chunk))
+
+        coins_table = pa.table({
+            "id": [c["id"] for c in written],
+            "symbol": [c["symbol"] for c in written],
+            "name": [c["name"] for c in written],
+            "rank": list(range(1, len(written) + 1))
+        }, schema=COINS_SCHEMA)
+        tmp_coins = f"{self.coins_file}.tmp"
+        pq.write_table(coins_table, tmp_coins)
+
+        os.replace(tmp_history, self.history_file)
+        os.replace(tmp_coins, self.coins_file)
+        logger.info(f"Wrote {len(written)} coins to {self.history_file}")
+        return len(written)
+
+    def read_coins(self):
+        """读取币种信息，按排名排序"""
+        return pq.read_table(self.coins_file).to_pandas()
+
+    def read(self, coin_ids=None, columns=None, start=None, end=None):
+        """
+        读取长表数据
+
+        参数:
+            coin_ids (list): 只读取这些币种
+            columns (list): 只读取这些数值列（coin_id 和 timestamp 总会返回）
+            start, end: 日期范围（含），可以是任何 pd.Timestamp 能解析的值
+
+        返回:
+            pa.Table
+        """
+        filters = []
+        if coin_ids is not None:
+            filters.append(("coin_id", "in", list(coin_ids)))
+        if start is not None:
+            filters.append(("timestamp", ">=", self._to_utc(start)))
+        if end is not None:
+            filters.append(("timestamp", "<=", self._to_utc(end)))
+        if columns is not None:
+            columns = ["coin_id", "timestamp"] + [c for c in columns if c not in ("coin_id", "timestamp")]
+        return pq.read_table(self.history_file, columns=columns, filters=filters or None)
+
+    @staticmethod
+    def _to_utc(value):
+        ts = pd.Timestamp(value)
+        ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+        return ts.to_pydatetime()
+
+    def load_frames(self, coin_ids=None, columns=None, start=None, end=None):
+        """
+        读取每个币种的数据框，索引为北京时间的日期
+
+        返回:
+            dict: {coin_id: DataFrame(price, volume, market_cap)}
+        """
+        df = self.read(coin_ids, columns, start, end).to_pandas()
+        df["date"] = df.pop("timestamp").dt.tz_convert("Asia/Shanghai")
+        df = df.set_index("date")
+
+        coin_ids_arr = df.pop("coin_id").to_numpy()
+        if len(coin_ids_arr) == 0:
+            return {}
+        # 数据按币种连续存放，直接按边界切片比 groupby 更快
+        boundaries = np.flatnonzero(coin_ids_arr[1:] != coin_ids_arr[:-1]) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(coin_ids_arr)]))
+        return {coin_ids_arr[s]: df.iloc[s:e] for s, e in zip(starts, ends)}
+
+    def migrate_from_csv(self, data_file="data.csv"):
+        """把旧的 data.csv（每行一个币种的 JSON 历史数据）一次性迁移到列式存储"""
+        csv.field_size_limit(2**31 - 1)
+        with open(data_file, newline="") as f:
+            rows = {row["id"]: row for row in csv.DictReader(f)}
+        coins = [{"id": r["id"], "symbol": r["symbol"], "name": r["name"]} for r in rows.values()]
+        count = self.write(coins, lambda coin_id: json.loads(rows[coin_id]["historical_data"]))
+        logger.info(f"Migrated {count} coins from {data_file} to {self.store_dir}")
+        return count
+
+def open_store(store_dir=STORE_DIR, legacy_file="data.csv"):
+    """打开列式存储，如果还没有创建但存在旧的 data.csv，则先自动迁移"""
+    store = HistoryStore(store_dir)
+    if not store.exists():
+        if not os.path.exists(legacy_file):
+            raise FileNotFoundError(f"No history store in {store_dir} and no {legacy_file} to migrate")
+        store.migrate_from_csv(legacy_file)
+    return store
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Manage the columnar coin history store')
+    parser.add_argument('--migrate', metavar='CSV', help='Migrate a legacy data.csv into the store')
+    parser.add_argument('--store', default=STORE_DIR, help='Store directory')
+    args = parser.parse_args()
+
+    if args.migrate:
+        HistoryStore(args.store).migrate_from_csv(args.migrate)
+
+if __name__ == '__main__':
+    main()
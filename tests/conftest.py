@@ -0,0 +1,55 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from panel import Panel, DAY_MS, FIELDS
+
+@pytest.fixture
+def scores_csv(tmp_path):
+    """一个小的 coin_scores.csv：包含同分、重复的 symbol 和缺失的评分"""
+    df = pd.DataFrame({
+        'id': ['bitcoin', 'ethereum', 'tether', 'solana', 'pepe', 'pepe-2'],
+        'symbol': ['btc', 'eth', 'usdt', 'sol', 'pepe', 'pepe'],
+        'name': ['Bitcoin', 'Ethereum', 'Tether', 'Solana', 'Pepe', 'Pepe 2'],
+        'rank': [1, 2, 3, 5, 40, 41],
+        'consolidation_score': [0, 5, 10, 5, 0, 0],
+        'volume_stability_score': [6, 4, 10, 8, 2, 2],
+        'breakout_score': [10, 0, 0, 10, 0, 10],
+        'rsi_score': [10, 5, 0, 5, 10, 0],
+        'ma_score': [10, 0, 0, 10, 0, 0],
+        'market_cap': [1.5e12, 4e11, 1e11, 8e10, 3e9, 1e9],
+        'total_score': [6.625, 3.5, 6.625, 8.25, None, 2.0],
+    })
+    path = tmp_path / 'coin_scores.csv'
+    df.to_csv(path, index=False)
+    return path
+
+def synthetic_panel(coins=6, days=200, seed=0):
+    """随机游走价格的合成面板，其中一个币种缺少前 20 天的数据"""
+    rng = np.random.default_rng(seed)
+    values = np.empty((coins, days, len(FIELDS)))
+    for i in range(coins):
+        price = 10 * np.exp(np.cumsum(rng.normal(0, 0.03, days)))
+        volume = rng.lognormal(15, 0.3, days)
+        values[i] = np.column_stack([price, volume, price * 1e7])
+    first_day = 19000
+    timestamps = np.tile((first_day + np.arange(days, dtype=np.int64)) * DAY_MS, (coins, 1))
+    timestamps[1, :20] = -1
+    values[1, :20] = np.nan
+    index = {
+        'coin_ids': [f'coin-{i}' for i in range(coins)],
+        'symbols': [f'c{i}' for i in range(coins)],
+        'names': [f'Coin {i}' for i in range(coins)],
+        'fields': list(FIELDS),
+        'generation': 1,
+        'first_day': first_day
+    }
+    return Panel(values, timestamps, index)
+
+@pytest.fixture
+def panel():
+    return synthetic_panel()
@@ -0,0 +1,71 @@
+import json
+import web
+from events import KEEPALIVE, Broadcaster
+
+class State:
+    def __init__(self):
+        self.version = 1
+
+    def poll(self):
+        return str(self.version), self.version
+
+def diff(previous, current):
+    return {'from': previous, 'to': current}
+
+def parse(message):
+    lines = dict(line.split(': ', 1) for line in message.decode().strip().split('\n'))
+    return lines['event'], json.loads(lines['data'])
+
+def test_subscribers_share_one_update():
+    state = State()
+    broadcaster = Broadcaster(state.poll, diff, interval=3600)
+    streams = [broadcaster.subscribe('1') for _ in range(3)]
+    assert [next(stream) for stream in streams] == [KEEPALIVE] * 3
+
+    state.version = 2
+    assert broadcaster.refresh()
+    messages = [next(stream) for stream in streams]
+    assert messages[0] is messages[1] is messages[2]
+    assert parse(messages[0]) == ('update', {'from': 1, 'to': 2, 'id': '2'})
+    assert not broadcaster.refresh()
+
+def test_subscriber_newer_than_last_poll():
+    state = State()
+    broadcaster = Broadcaster(state.poll, diff, interval=3600)
+    broadcaster.start()
+    # 页面由轮询之后发布的新版本渲染
+    state.version = 2
+    stream = broadcaster.subscribe('2')
+    assert next(stream) == KEEPALIVE
+    assert broadcaster.state_id == '2'
+    assert not broadcaster.refresh()
+
+def test_stale_subscriber_gets_reset():
+    state = State()
+    broadcaster = Broadcaster(state.poll, diff, interval=3600)
+    assert parse(next(broadcaster.subscribe('0'))) == ('reset', {'id': '1'})
+
+def test_subscriber_limit():
+    broadcaster = Broadcaster(State().poll, diff, interval=3600, max_subscribers=2)
+    assert broadcaster.acquire() and broadcaster.acquire()
+    assert not broadcaster.acquire()
+    broadcaster.release()
+    assert broadcaster.acquire()
+
+def test_events_endpoint_limit(scores_csv, monkeypatch):
+    from snapshot import SnapshotCache
+    monkeypatch.setattr(web, 'score_cache', SnapshotCache(str(scores_csv)))
+    monkeypatch.setattr(web.broadcaster, 'max_subscribers', 1)
+    client = web.app.test_client()
+
+    response = client.get('/api/events')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert next(response.response) == KEEPALIVE
+
+    rejected = client.get('/api/events')
+    assert rejected.status_code == 503
+    assert rejected.headers['Retry-After'] == str(web.EVENTS_RETRY_SECONDS)
+
+    response.close()
+    assert web.broadcaster.subscribers == 0
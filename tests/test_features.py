@@ -0,0 +1,33 @@
+import json
+import numpy as np
+import pytest
+import scoring
+from features import load_config, rescore, rescore_many
+
+@pytest.fixture
+def features(panel):
+    return scoring.score_panel(panel, with_features=True)[1]
+
+def test_default_rescore_matches_scores(panel, features):
+    df = rescore(features)
+    np.testing.assert_allclose(df['total_score'], scoring.score_panel(panel)['total_score'])
+
+def test_unknown_weight_is_rejected(features, tmp_path):
+    with pytest.raises(ValueError, match='rsi_scroe'):
+        rescore(features, {'rsi_scroe': 2})
+    with pytest.raises(ValueError, match='rsi_scroe'):
+        rescore_many(features, [{'rsi_score': 1}, {'rsi_scroe': 1}])
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'weights': {'rsi_scroe': 2}}))
+    with pytest.raises(ValueError, match='rsi_scroe'):
+        load_config(str(path))
+
+def test_zero_weights_are_rejected(features):
+    with pytest.raises(ValueError, match='zero'):
+        rescore(features, {name: 0 for name in scoring.DEFAULT_WEIGHTS})
+    with pytest.raises(ValueError, match='zero'):
+        rescore_many(features, [{'rsi_score': 0}])
+
+def test_missing_weights_count_as_zero(features):
+    totals = rescore_many(features, [{'rsi_score': 1}])
+    np.testing.assert_allclose(totals[:, 0], rescore(features, {'rsi_score': 1})['total_score'])
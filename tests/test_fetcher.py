@@ -0,0 +1,46 @@
+import asyncio
+import httpx
+from http_cache import ResponseCache
+from data_processor import AsyncCoinGeckoFetcher
+
+def fetcher(tmp_path, **kwargs):
+    cache = ResponseCache(cache_dir=str(tmp_path), enabled=False)
+    return AsyncCoinGeckoFetcher(rate_per_minute=60000, base_delay=0, cache=cache, **kwargs)
+
+def test_malformed_json_is_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr('data_processor.random.uniform', lambda a, b: 0)
+    bodies = [b'{"prices": [[1, ', b'{"prices": []}']
+
+    def handler(request):
+        return httpx.Response(200, content=bodies.pop(0))
+
+    async def get():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await api._get_json(client, 'https://example.test/coins/btc/market_chart', {}, 'btc')
+
+    api = fetcher(tmp_path, max_retries=3)
+    assert asyncio.run(get()) == {'prices': []}
+    assert api.request_count == 2
+
+def test_failing_callback_does_not_stop_other_coins(tmp_path):
+    api = fetcher(tmp_path, concurrency=2)
+    coins = [{'id': f'coin-{i}'} for i in range(6)]
+
+    async def get_top_coins(client, start, end):
+        return coins
+
+    async def get_historical_data(client, coin_id, days):
+        await asyncio.sleep(0)
+        return coin_id
+
+    saved = []
+
+    def on_result(coin, historical_data):
+        if coin['id'] == 'coin-1':
+            raise OSError('disk full')
+        saved.append(historical_data)
+
+    api.get_top_coins = get_top_coins
+    api.get_historical_data = get_historical_data
+    assert api.run([(1, 6)], on_result) == coins
+    assert sorted(saved) == ['coin-0', 'coin-2', 'coin-3', 'coin-4', 'coin-5']
@@ -0,0 +1,4 @@
+import indicator_state
+
+def test_incremental_state_matches_per_coin(panel):
+    assert indicator_state.verify(panel, days=5) == 0
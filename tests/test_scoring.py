@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+import scoring
+
+def test_batched_scoring_matches_per_coin(panel):
+    assert scoring.verify(panel) == 0
+
+def test_score_panel_skips_nothing_on_full_history(panel):
+    df = scoring.score_panel(panel)
+    assert list(df['id']) == panel.coin_ids
+    assert np.isfinite(df['total_score']).all()
+
+def test_per_coin_chunks_return_the_batched_features(panel):
+    from data_processor import analyze_coins
+    coins = scoring.panel_coins(panel)
+    chunks = [analyze_coins(panel, coins[i:i + 4], with_features=True) for i in range(0, len(coins), 4)]
+    features = pd.concat([features for _, features in chunks], ignore_index=True)
+    pd.testing.assert_frame_equal(features, scoring.score_panel(panel, coins, with_features=True)[1])
+    assert [r['id'] for results, _ in chunks for r in results] == panel.coin_ids
@@ -0,0 +1,17 @@
+from signals import signal_diff
+
+def signal(symbol, price, score=7.5):
+    return {'symbol': symbol, 'score': score, 'price': price,
+            'stop_loss': price * 0.9, 'take_profit': price * 1.2}
+
+def test_signal_diff_by_content():
+    previous = {'signals': [signal('BTC', 100.0), signal('ETH', 10.0), signal('SOL', 5.0)]}
+    current = {'signals': [signal('BTC', 100.0), signal('ETH', 12.0), signal('DOGE', 0.1)]}
+    diff = signal_diff(previous, current)
+    assert diff['signals'] == [signal('ETH', 12.0), signal('DOGE', 0.1)]
+    assert diff['withdrawn'] == ['SOL']
+
+def test_signal_diff_without_previous_publish():
+    current = {'signals': [signal('BTC', 100.0)]}
+    assert signal_diff(None, current) == {'signals': current['signals'], 'withdrawn': []}
+    assert signal_diff(current, None) == {'signals': [], 'withdrawn': ['BTC']}
@@ -0,0 +1,126 @@
+import gzip
+import json
+import pandas as pd
+import pytest
+import web
+from snapshot import INDEX_COLUMNS, INDEX_TOP_N, CoinQuery, ScoreSnapshot, SnapshotCache, load_snapshot, parse_query
+
+def test_parse_query_defaults():
+    assert parse_query('') == CoinQuery((), None, None, 0, None)
+
+def test_parse_query_options_and_filters():
+    query = parse_query('sort=-total_score&limit=2&offset=1&fields=symbol,total_score'
+                        '&total_score%3E%3D3&rank<=40&symbol!=eth')
+    assert query.sort == ('total_score', True)
+    assert query.limit == 2 and query.offset == 1
+    assert query.fields == ('symbol', 'total_score')
+    assert query.filters == (('total_score', '>=', '3'), ('rank', '<=', '40'), ('symbol', '!=', 'eth'))
+    assert parse_query('sort=rank').sort == ('rank', False)
+
+@pytest.mark.parametrize('query_string', ['limit=-1', 'offset=abc', 'bogus', 'rank~3'])
+def test_parse_query_rejects_invalid(query_string):
+    with pytest.raises(ValueError):
+        parse_query(query_string)
+
+def symbols(snapshot, query_string):
+    rows = snapshot.select(parse_query(query_string))
+    return [snapshot.records[i]['id'] for i in rows]
+
+def test_select_filters(scores_csv):
+    snapshot = load_snapshot(scores_csv)
+    assert symbols(snapshot, 'total_score>6') == ['bitcoin', 'tether', 'solana']
+    assert symbols(snapshot, 'total_score>=6.625&rank<3') == ['bitcoin']
+    assert symbols(snapshot, 'rank!=1&rank<5') == ['ethereum', 'tether']
+    assert symbols(snapshot, 'symbol=PEPE') == ['pepe', 'pepe-2']
+    assert symbols(snapshot, 'symbol!=pepe&total_score<4') == ['ethereum']
+
+def test_select_sort_is_stable_and_puts_missing_last(scores_csv):
+    snapshot = load_snapshot(scores_csv)
+    assert symbols(snapshot, 'sort=-total_score') == ['solana', 'bitcoin', 'tether', 'ethereum', 'pepe-2', 'pepe']
+    assert symbols(snapshot, 'sort=total_score') == ['pepe-2', 'ethereum', 'bitcoin', 'tether', 'solana', 'pepe']
+    assert symbols(snapshot, 'sort=rank&limit=2') == ['bitcoin', 'ethereum']
+
+def test_select_paging_bounds(scores_csv):
+    snapshot = load_snapshot(scores_csv)
+    assert symbols(snapshot, 'sort=-total_score&limit=2&offset=1') == ['bitcoin', 'tether']
+    assert symbols(snapshot, 'sort=-total_score&offset=5') == ['pepe']
+    assert symbols(snapshot, 'sort=-total_score&offset=10') == []
+    assert symbols(snapshot, 'limit=0') == []
+    assert symbols(snapshot, 'limit=100') == symbols(snapshot, '')
+
+@pytest.mark.parametrize('query_string', ['sort=nope', 'nope>1', 'fields=symbol,nope', 'sort=symbol',
+                                          'symbol>btc', 'rank>abc'])
+def test_select_rejects_invalid(scores_csv, query_string):
+    snapshot = load_snapshot(scores_csv)
+    with pytest.raises(ValueError):
+        snapshot.select(parse_query(query_string))
+
+def test_body_projection(scores_csv):
+    snapshot = load_snapshot(scores_csv)
+    body = json.loads(snapshot.body(parse_query('sort=-total_score&limit=2&fields=symbol,rank')))
+    assert body == [{'symbol': 'sol', 'rank': 5}, {'symbol': 'btc', 'rank': 1}]
+    assert [record['id'] for record in json.loads(snapshot.body(parse_query('')))] == list(snapshot.ids)
+
+def test_index_coins_order(scores_csv):
+    snapshot = load_snapshot(scores_csv)
+    assert [coin['id'] for coin in snapshot.index_coins] == ['solana', 'bitcoin', 'tether', 'ethereum', 'pepe-2', 'pepe']
+    assert snapshot.index_coins[-1]['total_score'] == 0.0
+
+@pytest.fixture
+def client(scores_csv, monkeypatch):
+    monkeypatch.setattr(web, 'score_cache', SnapshotCache(str(scores_csv)))
+    return web.app.test_client()
+
+def test_api_coins_query(client):
+    response = client.get('/api/coins?sort=-total_score&limit=1&fields=id')
+    assert response.status_code == 200
+    assert response.get_json() == [{'id': 'solana'}]
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+@pytest.mark.parametrize('query_string', ['sort=nope', 'limit=-5', 'rank~1'])
+def test_api_coins_bad_request(client, query_string):
+    response = client.get(f'/api/coins?{query_string}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_api_coins_etag(client):
+    response = client.get('/api/coins')
+    etag = response.headers['ETag']
+    assert client.get('/api/coins', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/coins', headers={'If-None-Match': '"other"'}).status_code == 200
+
+def test_api_coins_gzip(client, monkeypatch):
+    monkeypatch.setattr('snapshot.COMPRESS_MIN_BYTES', 0)
+    plain = client.get('/api/coins')
+    compressed = client.get('/api/coins', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert gzip.decompress(compressed.data) == plain.data
+
+def snapshot_of(total_scores, generation=1):
+    df = pd.DataFrame({
+        'id': [f'coin-{i}' for i in range(len(total_scores))],
+        'symbol': [f'c{i}' for i in range(len(total_scores))],
+        'name': [f'Coin {i}' for i in range(len(total_scores))],
+        'rank': range(1, len(total_scores) + 1),
+        **{column: 0 for column in INDEX_COLUMNS},
+    })
+    df['total_score'] = total_scores
+    return ScoreSnapshot(df, (generation, 0), 0)
+
+def test_diff_sends_index_membership():
+    previous = snapshot_of([5.0] * INDEX_TOP_N + [1.0])
+    # 第一个币种跌出首页，没有变化的第 51 个币种进入首页
+    current = snapshot_of([0.5] + [5.0] * (INDEX_TOP_N - 1) + [1.0], generation=2)
+    diff = current.diff(previous)
+    assert diff['index'] == [coin['id'] for coin in current.index_coins]
+    assert 'coin-0' not in diff['index'] and f'coin-{INDEX_TOP_N}' in diff['index']
+    assert [coin['id'] for coin in diff['changed']] == [f'coin-{INDEX_TOP_N}']
+
+def test_diff_against_empty_snapshot():
+    current = snapshot_of([3.0, 2.0])
+    diff = current.diff(snapshot_of([]))
+    assert diff['changed'] == current.index_coins
+    assert snapshot_of([]).diff(current) == {'index': [], 'changed': []}
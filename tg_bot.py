@@ -1,4 +1,5 @@
 import os
+import logging
 import pandas as pd
 import asyncio
 import argparse
@@ -8,7 +9,8 @@ from telegram.ext import ApplicationBuilder, CommandHandler, Application
 from dotenv import load_dotenv
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime, time
-from backtest import Backtester, DataLoader
+from signals import load_signals
+from sqlite_store import get_sqlite_store
 
 # 加载环境变量
 load_dotenv()
@@ -16,6 +18,8 @@ load_dotenv()
 TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 
+logger = logging.getLogger(__name__)
+
 def get_top_50_coins():
     try:
         df = pd.read_csv('coin_scores.csv')
@@ -60,47 +64,25 @@ def get_top_50_coins():
 def get_trading_signals():
     """获取交易建议"""
     try:
-        # 加载数据
-        data_loader = DataLoader()
-        coin_data = data_loader.load_data()
-        
-        # 初始化回测器
-        backtester = Backtester(
-            coin_data=coin_data,
-            initial_capital=10000,
-            stop_loss=0.1,
-            take_profit=0.2
-        )
-        
-        # 获取当前日期的信号
-        current_date = pd.Timestamp.now(tz='UTC')
-        signals = backtester.generate_signals(coin_data, [current_date], current_date)
+        # 读取分析任务发布的信号快照
+        try:
+            snapshot = load_signals()
+        except FileNotFoundError:
+            return "No trading signals published yet. They are updated after the daily analysis."
         
         # 生成交易建议消息
         message = "🎯 *Trading Signals*\n\n"
         
-        # 按信号强度排序
-        sorted_signals = sorted(
-            [(symbol, data) for symbol, data in signals.items()],
-            key=lambda x: x[1]['total_score'],
-            reverse=True
-        )
-        
-        # 生成买入建议
+        # 生成买入建议（快照中已按信号强度排序并过滤）
         buy_suggestions = []
-        for symbol, signal in sorted_signals[:5]:  # 取前5个最强信号
-            if signal['total_score'] > 7:  # 与回测系统保持一致的阈值
-                price = coin_data[symbol]['data'].iloc[-1]['price']
-                stop_loss = price * (1 - backtester.stop_loss)
-                take_profit = price * (1 + backtester.take_profit)
-                
-                buy_suggestions.append(
-                    f"📈 *{symbol}*\n"
-                    f"Score: {signal['total_score']:.1f}\n"
-                    f"Entry: ${price:.4f}\n"
-                    f"Stop Loss: ${stop_loss:.4f}\n"
-                    f"Take Profit: ${take_profit:.4f}\n"
-                )
+        for signal in snapshot['signals']:
+            buy_suggestions.append(
+                f"📈 *{signal['symbol']}*\n"
+                f"Score: {signal['score']:.1f}\n"
+                f"Entry: ${signal['price']:.4f}\n"
+                f"Stop Loss: ${signal['stop_loss']:.4f}\n"
+                f"Take Profit: ${signal['take_profit']:.4f}\n"
+            )
         
         if buy_suggestions:
             message += "*🟢 Buy Suggestions:*\n"
@@ -119,6 +101,40 @@ def get_trading_signals():
     except Exception as e:
         return f"Error generating trading signals: {str(e)}"
 
+def get_coin_summary(coin, days=30):
+    """单个币种最近N天的行情和评分（需要启用SQLite存储）"""
+    try:
+        db = get_sqlite_store()
+        if db is None:
+            return "Coin lookup requires the SQLite store (set COIN_SQLITE_DB)."
+        
+        info = db.find_coin(coin.lower())
+        if info is None:
+            return f"Unknown coin: {coin}"
+        
+        history = db.coin_history(info['id'], days)
+        if not history:
+            return f"No history available for {info['symbol'].upper()}."
+        
+        prices = [h['price'] for h in history]
+        change = (prices[-1] / prices[0] - 1) * 100 if prices[0] else 0
+        message = (
+            f"📊 *{info['symbol'].upper()}* ({info['name']}) #{info['rank']}\n\n"
+            f"Price: ${prices[-1]:.4f}\n"
+            f"{days}d Change: {change:+.2f}%\n"
+            f"{days}d High: ${max(prices):.4f}\n"
+            f"{days}d Low: ${min(prices):.4f}\n"
+        )
+        
+        score = db.coin_score(info['id'])
+        if score is not None:
+            message += f"Score: {score['total_score']:.1f} ({score['run_date']})\n"
+        
+        return message
+        
+    except Exception as e:
+        return f"Error looking up {coin}: {str(e)}"
+
 def get_latest_trading_signals():
     """从最新的日志文件中获取交易信号"""
     try:
@@ -196,7 +212,8 @@ async def start(update, context):
         "- Top 50 coins by score\n"
         "- Detailed technical indicators\n"
         "- Market cap ranking\n\n"
-        "📈 Use /update for immediate analysis."
+        "📈 Use /update for immediate analysis.\n"
+        "🔎 Use /coin <symbol> for a single coin."
     )
     await update.message.reply_text(
         welcome_message,
@@ -221,6 +238,17 @@ async def get_update(update, context):
         parse_mode=ParseMode.MARKDOWN
     )
 
+async def get_coin(update, context):
+    """查询单个币种的命令处理函数，例如 /coin btc"""
+    if not context.args:
+        await update.message.reply_text("Usage: /coin <symbol>")
+        return
+    
+    await update.message.reply_text(
+        get_coin_summary(context.args[0]),
+        parse_mode=ParseMode.MARKDOWN
+    )
+
 async def manual_send():
     """手动发送消息的函数"""
     bot = Bot(token=TOKEN)
@@ -259,6 +287,7 @@ async def run_bot(scheduler_enabled=True):
     # 添加命令处理器
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("update", get_update))
+    application.add_handler(CommandHandler("coin", get_coin))
 
     # 根据参数决定是否启用调度器
     if scheduler_enabled:
@@ -0,0 +1,180 @@
+import os
+import logging
+from flask import Flask, Response, render_template, jsonify, request
+from sqlite_store import get_sqlite_store
+from snapshot import ENCODINGS, FileCache, SnapshotCache, parse_query
+from signals import SIGNALS_FILE, load_signals, signal_diff
+from events import Broadcaster
+
+logger = logging.getLogger(__name__)
+
+# 创建Flask应用
+app = Flask(__name__)
+
+# coin_scores.csv 的内存快照，文件更新后自动重新加载
+score_cache = SnapshotCache()
+
+# 分析任务发布的交易信号快照，不再为每个请求重新构建 Backtester
+signal_cache = FileCache(SIGNALS_FILE, load_signals)
+
+@app.route('/')
+def index():
+    """主页面"""
+    try:
+        # 读取分析结果的内存快照（已按总分排序，只包含首页展示的币种）
+        snapshot = score_cache.get()
+        
+        # 获取最新发布的交易信号
+        signals = get_signal_snapshot()
+        
+        return render_template('index.html', 
+                             coins=snapshot.index_coins,
+                             update_time=snapshot.update_time,
+                             trading_signals=signals['signals'] if signals else [],
+                             state_id=state_id(snapshot, signals))
+        
+    except Exception as e:
+        logger.error(f"Error loading index page: {e}")
+        logger.exception("Detailed error:")
+        return "Error loading data", 500
+
+def get_signal_snapshot():
+    """分析任务发布的信号快照，还没有发布过或读取失败时为 None"""
+    try:
+        return signal_cache.get()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Error reading trading signals: {e}")
+        return None
+
+def get_trading_signals():
+    """获取交易建议（还没有发布过时为空）"""
+    signals = get_signal_snapshot()
+    return signals['signals'] if signals else []
+
+def state_id(snapshot, signals):
+    """首页数据的版本：评分快照版本和信号 generation，与 SSE 消息的 id 相同"""
+    return f"{snapshot.etag()}-{signals['generation'] if signals else 0}"
+
+def current_state():
+    snapshot = score_cache.get()
+    signals = get_signal_snapshot()
+    return state_id(snapshot, signals), (snapshot, signals)
+
+def state_diff(previous, current):
+    """两个版本之间首页数据的差异：首页的币种及其中变化的评分、新出现或变化的交易信号和撤销的信号"""
+    (old_snapshot, old_signals), (snapshot, signals) = previous, current
+    payload = {'update_time': snapshot.update_time}
+    if snapshot is not old_snapshot:
+        payload.update(snapshot.diff(old_snapshot))
+    payload.update(signal_diff(old_signals, signals))
+    return payload
+
+# 订阅数已满时建议客户端重试的间隔（秒）
+EVENTS_RETRY_SECONDS = 60
+
+# 所有 SSE 连接共享的广播器，每个版本只计算和序列化一次差异
+broadcaster = Broadcaster(current_state, state_diff)
+
+@app.route('/api/events')
+def get_events():
+    """
+    首页数据更新的 Server-Sent Events 流
+
+    数据处理任务发布新版本时推送一条 update 消息（变化的评分和新的交易信号）；
+    客户端通过 since 参数或 Last-Event-ID 告知已有的版本，版本已过期时先收到 reset。
+    订阅数达到上限时返回 503，客户端稍后重试。
+    """
+    if not broadcaster.acquire():
+        response = jsonify({'error': 'Too many event subscribers, retry later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(EVENTS_RETRY_SECONDS)
+        return response
+
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    response = Response(broadcaster.subscribe(since), mimetype='text/event-stream')
+    response.call_on_close(broadcaster.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/signals')
+def get_signals():
+    """最新发布的交易信号快照"""
+    try:
+        return jsonify(signal_cache.get())
+    except FileNotFoundError:
+        return jsonify({'error': 'No trading signals published yet'}), 404
+
+def accepted_encoding():
+    """客户端接受的压缩方式中优先级最高的一个"""
+    for encoding in ENCODINGS:
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+@app.route('/api/coins')
+def get_coins():
+    """
+    获取币种数据的API端点
+
+    支持查询参数：sort=-total_score, total_score>=7, rank<=100, limit=20, offset=40, fields=symbol,total_score。
+    响应带有与评分版本绑定的 ETag，未变化时返回 304。
+    """
+    try:
+        if not os.path.exists(score_cache.path):
+            db = get_sqlite_store()
+            if db is not None:
+                return jsonify(db.latest_scores())
+        snapshot = score_cache.get()
+        try:
+            query = parse_query(request.query_string.decode())
+            body, encoding = snapshot.response(query, accepted_encoding())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        etag = snapshot.etag(encoding)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        logger.error(f"Error fetching coin data: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/coins/<coin>/history')
+def get_coin_history(coin):
+    """获取单个币种最近N天数据的API端点（需要启用SQLite存储）"""
+    try:
+        db = get_sqlite_store()
+        if db is None:
+            return jsonify({"error": "SQLite store is not enabled, set COIN_SQLITE_DB"}), 404
+        info = db.find_coin(coin)
+        if info is None:
+            return jsonify({"error": f"Unknown coin: {coin}"}), 404
+        days = request.args.get('days', 30, type=int)
+        return jsonify({**info, 'history': db.coin_history(info['id'], days)})
+    except Exception as e:
+        logger.error(f"Error fetching history for {coin}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def warm_caches():
+    """预先加载评分和信号快照（多进程服务时在 fork 之前调用，各工作进程共享已加载的内容）"""
+    for cache in (score_cache, signal_cache):
+        try:
+            cache.get()
+        except FileNotFoundError:
+            logger.warning(f"{cache.path} does not exist yet, it will be loaded on first request")
+
+def init_worker():
+    """工作进程初始化后调用：重新创建 fork 之前建立的锁，gevent 打补丁后使用协程友好的版本"""
+    for cache in (score_cache, signal_cache):
+        cache.reset()
+    broadcaster.reset()